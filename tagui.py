@@ -9,13 +9,25 @@ import os
 import sys
 import time
 import platform
+import json
+import contextlib
+import threading
+import tempfile
+import shutil
+import types
+import socket
+import hashlib
+import collections
+import base64
+import re
+
+# required for python 2 and 3 queue of tagui output lines
+try: import queue
+except ImportError: import Queue as queue
 
 # required for python 2 usage of io.open
 if sys.version_info[0] < 3: import io
 
-# default timeout in seconds for UI element
-_tagui_timeout = 10.0
-
 # default delay in seconds in while loops
 _tagui_delay = 0.1
 
@@ -25,23 +37,111 @@ _tagui_debug = False
 # error flag to raise exception on error
 _tagui_error = False
 
-# flag to track if tagui session is started
-_tagui_started = False
+# record returned by snapshot(), counts, present and reads are keyed by identifier
+_Snapshot = collections.namedtuple('Snapshot', ['url', 'title', 'text', 'timer', 'counts', 'present', 'reads'])
+
+# url patterns blocked by block() for each resource type, tracker is for common analytics and ads
+_tagui_block_types = {'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp', '*.avif'],
+                      'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+                      'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg', '*.wav', '*.m3u8', '*.mpd'],
+                      'stylesheet': ['*.css'],
+                      'tracker': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                                  '*googlesyndication.com*', '*facebook.net*', '*hotjar.com*', '*scorecardresearch.com*']}
+
+# url with query string is common for cdn, eg /a.png?v=3, so file extension patterns also match it
+for _block_patterns in _tagui_block_types.values():
+    _block_patterns.extend([_block_pattern + '?*' for _block_pattern in list(_block_patterns) if not _block_pattern.endswith('*')])
+
+# to append timing of init() and close() phases to log file of phases() one at a time
+_tagui_phases_lock = threading.Lock()
+
+class Session(object):
+    """class to track a tagui session, for multiple tagui processes in one python process"""
+
+    def __init__(self, working_directory = None):
+        # directory to run tagui in, '' for current directory and None for a private temp directory
+        self._working_directory = working_directory
+
+        # to track tagui process and its working directory for generated files
+        self._process = None
+        self._tagui_directory = ''
+
+        # default timeout in seconds for UI element
+        self._tagui_timeout = 10.0
+
+        # default max seconds to wait for tagui response, 0 for no limit
+        self._tagui_deadline = 0.0
+
+        # flag to return results in-band on live mode output instead of rpa_python.txt
+        self._tagui_inband = True
+
+        # flag to track if tagui session is started
+        self._tagui_started = False
+
+        # flag to track visual automation connected
+        self._tagui_visual = False
+
+        # flag to track chrome browser connected
+        self._tagui_chrome = False
+
+        # flag to track chrome browser launched by init(), as sessions share its port and profile
+        self._tagui_browser = False
+
+        # id to track instruction count from rpa python to tagui
+        self._tagui_id = 0
+
+        # to track the original directory when init() was called
+        self._tagui_init_directory = ''
+
+        # to track file download directory for web browser
+        self._tagui_download_directory = ''
+
+        # to track in-band results received from tagui, keyed by instruction id
+        self._tagui_results = {}
+
+        # to track [xpath, url] of strategy found for each identifier, to skip other strategies
+        self._tagui_strategies = {}
+
+        # percentile of wait times to cap wait for each identifier, None when off
+        self._tagui_adaptive = None
+
+        # to track recent wait times in seconds for each identifier found
+        self._tagui_latencies = {}
+
+        # to track instructions queued by batch() to send in one round-trip
+        self._tagui_batch = None
+
+        # to track result of batch() for its context object, False if any send of batch fails
+        self._tagui_batch_result = None
+
+        # to track tagui output lines queued by reader thread for blocking reads
+        self._tagui_output_queue = None
+
+        # to track wait time per instruction when measure() is on, None when off
+        self._tagui_measure = None
 
-# flag to track visual automation connected
-_tagui_visual = False
+        # to track time taken by each phase of last init() and close()
+        self._tagui_phases = {'init': [], 'close': []}
 
-# flag to track chrome browser connected
-_tagui_chrome = False
+        # file to append timing of init() and close() phases as json lines, '' for none
+        self._tagui_phases_log = ''
 
-# id to track instruction count from rpa python to tagui
-_tagui_id = 0
+    def __enter__(self):
+        # make this session used by module functions in current thread
+        if not hasattr(_tagui_current, 'sessions'): _tagui_current.sessions = []
+        _tagui_current.sessions.append(self); return self
 
-# to track the original directory when init() was called
-_tagui_init_directory = ''
+    def __exit__(self, exc_type, exc_value, traceback):
+        _tagui_current.sessions.pop(); return False
 
-# to track file download directory for web browser
-_tagui_download_directory = ''
+# to track session used by module functions in each thread
+_tagui_current = threading.local()
+
+# default session for module functions, running tagui in current directory
+_tagui_session = Session('')
+
+# to track sessions started, to not end their processes when starting another
+_tagui_sessions = []; _tagui_sessions_lock = threading.Lock()
 
 # to track location of TagUI (default user home folder)
 if platform.system() == 'Windows':
@@ -57,22 +157,882 @@ _tagui_local_js = \
 """// local custom helper function to check if UI element exists
 // keep checking until timeout is reached before return result
 // effect is interacting with element as soon as it appears
+// web element is waited for by mutation observer in webpage,
+// polling every poll_interval ms is for visual automation
+// exist_wait ms is to wait instead of timeout for this check only
 
-function exist(element_identifier) {
+function exist(element_identifier, poll_interval, exist_wait) {
 
-    var exist_timeout = Date.now() + casper.options.waitTimeout;
+    if (typeof poll_interval === 'undefined' || poll_interval === null) poll_interval = 100;
+    if (typeof exist_wait === 'undefined' || exist_wait === null) exist_wait = casper.options.waitTimeout;
+    var exist_timeout = Date.now() + exist_wait; var observer_found = false;
+
+    // stale element handle from find() is found again by its original identifier
+    var handle_identifier = rpa_handles.hasOwnProperty(element_identifier) ? rpa_handles[element_identifier] : null;
 
     while (Date.now() < exist_timeout) {
         if (present(element_identifier))
             return true;
-        else
-           sleep(100);
+
+        else if (handle_identifier !== null && present(handle_identifier) && rpa_handle(element_identifier, handle_identifier))
+            return true;
+
+        // poll if observer found element that present() does not, to avoid busy loop
+        else if (!rpa_chrome || observer_found || rpa_visual(element_identifier))
+            sleep(poll_interval);
+
+        else {
+            observer_found = rpa_wait(handle_identifier || element_identifier, Math.min(exist_timeout - Date.now(), 1000));
+            if (observer_found === null) {observer_found = false; sleep(poll_interval);}
+        }
+    }
+
+    return false;
+
+}
+
+// element handles from find(), xpath of handle attribute to original identifier
+
+var rpa_handles = {}; var rpa_handle_count = 0;
+
+// function to find element and mark it with handle attribute, returns xpath of handle
+// result is null if element is not found before timeout
+
+function rpa_find_handle(element_identifier) {
+
+    if (!exist(element_identifier)) return null;
+    rpa_handle_count++; var handle_xpath = '//*[@data-rpa-handle-' + rpa_handle_count + ']';
+    if (!rpa_handle(handle_xpath, element_identifier)) return null;
+    rpa_handles[handle_xpath] = element_identifier; return handle_xpath;
+
+}
+
+// function to mark element of identifier with handle attribute in webpage, moving it
+// from element marked before, returns true if element is marked
+
+function rpa_handle(handle_xpath, element_identifier) {
+
+    var handle_locator = tx(element_identifier); var handle_element_xpath = ''; var handle_element_css = '';
+    if (typeof handle_locator === 'object' && handle_locator.type === 'xpath') handle_element_xpath = handle_locator.path;
+    else handle_element_css = handle_locator.toString();
+
+    var handle_expression = '(' + rpa_page_handle.toString() + ')(' + chrome_context + ', ' + JSON.stringify(handle_element_xpath) + ', ' +
+                            JSON.stringify(handle_element_css) + ', ' + JSON.stringify(handle_xpath.slice(5, -1)) + ')';
+    try {
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: handle_expression, returnByValue: true}));
+        return ws_json.result.result.value === true;
+    } catch (e) {return false;}
+
+}
+
+// function run in webpage to mark first element matching xpath or css with attribute
+
+function rpa_page_handle(context, element_xpath, element_css, handle_attribute) {
+
+    var handle_element = null;
+    if (element_xpath !== '') handle_element = context.evaluate(element_xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    else handle_element = context.querySelector(element_css);
+    if (handle_element === null) return false;
+
+    var marked_elements = context.querySelectorAll('[' + handle_attribute + ']');
+    for (var marked_index = 0; marked_index < marked_elements.length; marked_index++) marked_elements[marked_index].removeAttribute(handle_attribute);
+    handle_element.setAttribute(handle_attribute, ''); return true;
+
+}
+
+// function to check if identifier is for visual automation, eg image or (x,y)
+
+function rpa_visual(element_identifier) {
+
+    var identifier = element_identifier.toString().toLowerCase();
+    if (identifier.substr(-4) == '.png' || identifier.substr(-4) == '.bmp') return true;
+    return (identifier.charAt(0) == '(' && identifier.charAt(identifier.length - 1) == ')' && !/[a-z]/.test(identifier));
+
+}
+
+// function to wait in webpage until element appears or wait_time ms passes
+// returns true if found, false if not found, null if webpage cannot be waited on
+
+function rpa_wait(element_identifier, wait_time) {
+
+    if (wait_time <= 0) return false;
+    var wait_expression = '(' + rpa_page_wait.toString() + ')(' + chrome_context + ', ' +
+                          JSON.stringify(element_identifier.toString()) + ', ' + Math.round(wait_time) + ')';
+
+    try {
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: wait_expression, awaitPromise: true, returnByValue: true}));
+        if (typeof ws_json.result.result.value === 'boolean') return ws_json.result.result.value;
+        else return null;
+    } catch (e) {return null;}
+
+}
+
+// function run in webpage to resolve as soon as mutation adds matching element
+// identifier is matched like tagui - xpath, css, then id, name, class, title,
+// aria-label, text and href, present() still decides if element exists
+
+function rpa_page_wait(context, identifier, wait_time) {
+
+    function rpa_find() {
+        var xpath_list = [identifier];
+        if (identifier.charAt(0) != '/' && identifier.charAt(0) != '(') {
+            try {if (context.querySelector(identifier) !== null) return true;} catch (e) {}
+            xpath_list = ['@id', '@name', '@class', '@title', '@aria-label', 'text()', '@href'].map(function(xpath_field) {
+                return '//*[contains(' + xpath_field + ',"' + identifier + '")]';});
+        }
+        for (var xpath_index = 0; xpath_index < xpath_list.length; xpath_index++) {
+            try {if (context.evaluate(xpath_list[xpath_index], context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null) return true;}
+            catch (e) {}
+        }
+        return false;
+    }
+
+    return new Promise(function(resolve) {
+        if (rpa_find()) {resolve(true); return;}
+        var wait_timer = null; var wait_observer = new MutationObserver(function() {
+            if (rpa_find()) {wait_observer.disconnect(); clearTimeout(wait_timer); resolve(true);}});
+        wait_observer.observe(context, {childList: true, subtree: true, attributes: true, characterData: true});
+        wait_timer = setTimeout(function() {wait_observer.disconnect(); resolve(false);}, wait_time);
+    });
+
+}
+
+// function to return result to rpa python in-band on live mode output
+// result line is framed with instruction id, eg [RPA][8] = "result"
+
+function rpa_result(result_id, result_value) {
+
+    if (typeof result_value === 'undefined') result_value = null;
+    casper.echo('[RPA][' + result_id + '] = ' + JSON.stringify(result_value));
+
+}
+
+// function to wait for element and act on it in one live mode instruction
+// result is null if element is not found before timeout, else true
+
+function rpa_fused(result_id, fused_action, element_identifier, strategy_found, exist_wait) {
+
+    var fused_strategy = rpa_strategy(element_identifier, strategy_found, null, exist_wait); var fused_text = null;
+    if (fused_strategy === null) {rpa_result(result_id, null); return;}
+    var fused_identifier = fused_strategy[0];
+
+    if (fused_action == 'click') chrome.click(tx(fused_identifier));
+    else if (fused_action == 'rclick') chrome.mouse.rightclick(tx(fused_identifier));
+    else if (fused_action == 'dclick') chrome.mouse.doubleclick(tx(fused_identifier));
+    else if (fused_action == 'hover') chrome.mouse.move(tx(fused_identifier));
+    else if (fused_action == 'read') fused_text = chrome.fetchText(tx(fused_identifier)).trim();
+
+    rpa_result(result_id, [fused_strategy, fused_text]);
+
+}
+
+// function to wait for element, checking xpath of strategy found before first, as
+// it needs one lookup instead of trying xpath, css, id, name, etc in turn
+// strategy found is [xpath, url], xpath is only used on webpage of url it is found on
+// result is [xpath of strategy found or identifier itself for css, url], null if not found
+
+function rpa_strategy(element_identifier, strategy_found, poll_interval, exist_wait) {
+
+    if (strategy_found !== null && strategy_found[1] === url() && present(strategy_found[0])) return strategy_found;
+    if (!exist(element_identifier, poll_interval, exist_wait)) return null;
+
+    var strategy_locator = tx(element_identifier);
+    if (typeof strategy_locator === 'object' && strategy_locator.type === 'xpath') return [strategy_locator.path, url()];
+    else return [element_identifier, url()];
+
+}
+
+// function to read list of elements in one live mode instruction, within one timeout
+// result is text of each element, null for element not found before timeout
+
+function rpa_read_many(read_identifiers) {
+
+    var read_timeout = Date.now() + casper.options.waitTimeout; var read_results = [];
+    var wait_timeout = casper.options.waitTimeout; var read_browser = rpa_chrome ? chrome : casper;
+
+    for (var read_index = 0; read_index < read_identifiers.length; read_index++) {
+        var read_identifier = read_identifiers[read_index];
+        if (read_identifier.toLowerCase() == 'page') {read_results.push(read_browser.getHTML()); continue;}
+
+        // wait for element within time left of shared timeout instead of full timeout
+        casper.options.waitTimeout = Math.max(read_timeout - Date.now(), 0);
+        try {var read_found = present(read_identifier) || exist(read_identifier);}
+        finally {casper.options.waitTimeout = wait_timeout;}
+
+        if (read_found) read_results.push(read_browser.fetchText(tx(read_identifier)).trim());
+        else read_results.push(null);
+    }
+
+    return read_results;
+
+}
+
+// function to get rows of table element as arrays of cell text, from row_start
+// result is {header, rows, total}, header is null if first row is not header
+
+function rpa_table(table_identifier, row_start, row_count) {
+
+    var table_locator = tx(table_identifier); var table_xpath = ''; var table_css = '';
+    if (typeof table_locator === 'object' && table_locator.type === 'xpath') table_xpath = table_locator.path;
+    else table_css = table_locator.toString();
+
+    var table_expression = '(' + rpa_page_table.toString() + ')(' + chrome_context + ', ' + JSON.stringify(table_xpath) + ', ' +
+                           JSON.stringify(table_css) + ', ' + row_start + ', ' + JSON.stringify(row_count) + ')';
+    try {
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: table_expression, returnByValue: true}));
+        if (typeof ws_json.result.result.value === 'object') return ws_json.result.result.value;
+        else return null;
+    } catch (e) {return null;}
+
+}
+
+// function run in webpage to get rows of table element, header is detected
+// from thead or first row of only th cells, same as header row of table()
+
+function rpa_page_table(context, table_xpath, table_css, row_start, row_count) {
+
+    var table_element = null;
+    if (table_xpath !== '') table_element = context.evaluate(table_xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    else table_element = context.querySelector(table_css);
+    if (table_element === null || !table_element.rows) return null;
+
+    function row_cells(table_row) {
+        var cell_texts = [];
+        for (var cell_index = 0; cell_index < table_row.cells.length; cell_index++)
+            cell_texts.push(table_row.cells[cell_index].textContent.trim());
+        return cell_texts;
+    }
+
+    var table_rows = table_element.rows; var table_header = null; var first_row = 0;
+    if (table_rows.length > 0 && (table_rows[0].parentNode.tagName == 'THEAD' ||
+        (table_rows[0].cells.length > 0 && table_rows[0].querySelectorAll('td').length == 0))) {
+        table_header = row_cells(table_rows[0]); first_row = 1;
+    }
+
+    var row_end = table_rows.length; if (row_count !== null) row_end = Math.min(row_end, first_row + row_start + row_count);
+    var row_texts = [];
+    for (var row_index = first_row + row_start; row_index < row_end; row_index++) row_texts.push(row_cells(table_rows[row_index]));
+    return {header: table_header, rows: row_texts, total: table_rows.length - first_row};
+
+}
+
+// function to get url, title, text, timer, counts, presence and reads of webpage
+// in one live mode instruction, read result is null for element not present
+
+function rpa_snapshot(snapshot_counts, snapshot_present, snapshot_reads) {
+
+    var snapshot_browser = rpa_chrome ? chrome : casper;
+    var snapshot_result = {url: url(), title: title(), text: text(), timer: timer(), counts: [], present: [], reads: []};
+
+    snapshot_counts.forEach(function(snapshot_identifier) {snapshot_result.counts.push(count(snapshot_identifier));});
+    snapshot_present.forEach(function(snapshot_identifier) {snapshot_result.present.push(present(snapshot_identifier));});
+    snapshot_reads.forEach(function(snapshot_identifier) {
+        if (present(snapshot_identifier)) snapshot_result.reads.push(snapshot_browser.fetchText(tx(snapshot_identifier)).trim());
+        else snapshot_result.reads.push(null);});
+
+    return snapshot_result;
+
+}
+
+// function to run list of dom statements in webpage in one live mode instruction
+// each result is {value} or {error}, statements returning promises are awaited
+
+function rpa_dom_json(dom_statements) {
+
+    var dom_expression = 'Promise.all([' + dom_statements.map(function(dom_statement) {
+        return 'Promise.resolve().then(function() {' + dom_statement + '\\n}).then(function(dom_value) {return {value: dom_value};}, ' +
+               'function(dom_error) {return {error: String(dom_error)};})';}).join(', ') + '])';
+
+    try {
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: dom_expression, awaitPromise: true, returnByValue: true}));
+        if (ws_json.result.result.value instanceof Array) return ws_json.result.result.value;
+        else return null;
+    } catch (e) {return null;}
+
+}
+
+// function to keep text, html or dom statement result in webpage for rpa python
+// to get in chunks, so that large text is never passed whole, returns its length
+
+function rpa_stream(stream_id, stream_source) {
+
+    var stream_expression = '(function() {' + stream_source + '\\n})()';
+    if (stream_source == 'text') stream_expression = chrome_context + '.body.innerText';
+    else if (stream_source == 'page') stream_expression = chrome_context + '.documentElement.outerHTML';
+
+    stream_expression = '(function() {var stream_text = String(' + stream_expression + '); ' +
+                        'window.rpa_streams = window.rpa_streams || {}; window.rpa_streams[' + stream_id + '] = stream_text; ' +
+                        'return stream_text.length;})()';
+    try {
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: stream_expression, returnByValue: true}));
+        if (typeof ws_json.result.result.value === 'number') return ws_json.result.result.value;
+        else return null;
+    } catch (e) {return null;}
+
+}
+
+// function to get chunk of text kept by rpa_stream(), text is removed after last chunk
+// result is text of chunk and size of text taken, null if text is not kept in webpage
+
+function rpa_stream_chunk(stream_id, chunk_start, chunk_size, chunk_last) {
+
+    var stream_expression = '(' + rpa_page_stream_chunk.toString() + ')(' + stream_id + ', ' + chunk_start + ', ' + chunk_size + ', ' + chunk_last + ')';
+    try {
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: stream_expression, returnByValue: true}));
+        if (ws_json.result.result.value && typeof ws_json.result.result.value.text === 'string') return ws_json.result.result.value;
+        else return null;
+    } catch (e) {return null;}
+
+}
+
+// function run in webpage to get chunk of text, size counts utf-16 code units so chunk
+// never ends between two halves of a character, eg emoji, it ends before or after it
+
+function rpa_page_stream_chunk(stream_id, chunk_start, chunk_size, chunk_last) {
+
+    if (typeof window.rpa_streams === 'undefined' || typeof window.rpa_streams[stream_id] !== 'string') return null;
+    var stream_text = window.rpa_streams[stream_id]; if (chunk_last) delete window.rpa_streams[stream_id];
+
+    var chunk_end = Math.min(chunk_start + chunk_size, stream_text.length);
+    if (chunk_end > chunk_start && chunk_end < stream_text.length) {
+        var chunk_code = stream_text.charCodeAt(chunk_end - 1);
+        if (chunk_code >= 0xD800 && chunk_code <= 0xDBFF) {
+            if (chunk_last || chunk_end - 1 == chunk_start) chunk_end++; else chunk_end--;
+        }
+    }
+    return {text: stream_text.substring(chunk_start, chunk_end), size: chunk_end - chunk_start};
+
+}
+
+// function to take one screenshot of webpage and crop it for each element in webpage
+// result is base64 png of each element, null for element not found before timeout
+
+function rpa_snap_many(snap_identifiers) {
+
+    var snap_timeout = Date.now() + casper.options.waitTimeout; var snap_rects = [];
+    var wait_timeout = casper.options.waitTimeout; var frame_offset_x = 0; var frame_offset_y = 0;
+    if (typeof frame_step_offset_x !== 'undefined') {frame_offset_x = frame_step_offset_x; frame_offset_y = frame_step_offset_y;}
+
+    for (var snap_index = 0; snap_index < snap_identifiers.length; snap_index++) {
+        var snap_identifier = snap_identifiers[snap_index];
+        if (snap_identifier.toLowerCase() == 'page') {snap_rects.push({page: true}); continue;}
+
+        // wait for element within time left of shared timeout instead of full timeout
+        casper.options.waitTimeout = Math.max(snap_timeout - Date.now(), 0);
+        try {var snap_found = present(snap_identifier) || exist(snap_identifier);}
+        finally {casper.options.waitTimeout = wait_timeout;}
+
+        if (!snap_found) {snap_rects.push(null); continue;}
+        var snap_rect = chrome.getRect(tx(snap_identifier));
+        snap_rects.push({x: snap_rect.left + frame_offset_x, y: snap_rect.top + frame_offset_y, width: snap_rect.width, height: snap_rect.height});
+    }
+
+    try {
+        // elements outside viewport are captured beyond viewport, with clip around all elements in webpage
+        var ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: '[window.innerWidth, window.innerHeight, window.scrollX, window.scrollY]', returnByValue: true}));
+        var snap_view = ws_json.result.result.value; var snap_clip = null; var snap_page = false;
+        for (var snap_index = 0; snap_index < snap_rects.length; snap_index++) {
+            var snap_rect = snap_rects[snap_index]; if (snap_rect === null) continue;
+            if (snap_rect.page) {snap_page = true; continue;}
+            if (snap_rect.x < 0 || snap_rect.y < 0 || snap_rect.x + snap_rect.width > snap_view[0] || snap_rect.y + snap_rect.height > snap_view[1]) snap_clip = {};
+        }
+
+        var crop_rects = snap_rects; var crop_width = snap_view[0];
+        if (snap_clip !== null) {
+            var clip_left = null; var clip_top = null; var clip_right = null; var clip_bottom = null;
+            for (var snap_index = 0; snap_index < snap_rects.length; snap_index++) {
+                var snap_rect = snap_rects[snap_index]; if (snap_rect === null || snap_rect.page) continue;
+                if (clip_left === null || snap_rect.x < clip_left) clip_left = snap_rect.x;
+                if (clip_top === null || snap_rect.y < clip_top) clip_top = snap_rect.y;
+                if (clip_right === null || snap_rect.x + snap_rect.width > clip_right) clip_right = snap_rect.x + snap_rect.width;
+                if (clip_bottom === null || snap_rect.y + snap_rect.height > clip_bottom) clip_bottom = snap_rect.y + snap_rect.height;
+            }
+            snap_clip = {x: clip_left + snap_view[2], y: clip_top + snap_view[3], width: clip_right - clip_left, height: clip_bottom - clip_top, scale: 1};
+            crop_rects = []; crop_width = snap_clip.width;
+            for (var snap_index = 0; snap_index < snap_rects.length; snap_index++) {
+                var snap_rect = snap_rects[snap_index];
+                if (snap_rect === null || snap_rect.page) crop_rects.push(null);
+                else crop_rects.push({x: snap_rect.x - clip_left, y: snap_rect.y - clip_top, width: snap_rect.width, height: snap_rect.height});
+            }
+        }
+
+        // viewport screenshot is for page, and elements too unless they are captured with clip
+        var page_data = null;
+        if (snap_clip === null || snap_page) page_data = JSON.parse(chrome_step('Page.captureScreenshot', {format: 'png'})).result.data;
+        var crop_data = page_data;
+        if (snap_clip !== null) crop_data = JSON.parse(chrome_step('Page.captureScreenshot', {format: 'png', clip: snap_clip, captureBeyondViewport: true})).result.data;
+
+        var snap_expression = '(' + rpa_page_crop.toString() + ')(' + JSON.stringify(crop_data) + ', ' + JSON.stringify(crop_rects) + ', ' + crop_width + ')';
+        ws_json = JSON.parse(chrome_step('Runtime.evaluate', {expression: snap_expression, awaitPromise: true, returnByValue: true}));
+        if (!(ws_json.result.result.value instanceof Array)) return null;
+        var snap_results = ws_json.result.result.value;
+        for (var snap_index = 0; snap_index < snap_rects.length; snap_index++)
+            if (snap_rects[snap_index] !== null && snap_rects[snap_index].page) snap_results[snap_index] = page_data;
+        return snap_results;
+    } catch (e) {return null;}
+
+}
+
+// function run in webpage to crop screenshot for each element rect using canvas,
+// rects are in css pixels of screenshot, css width, and scaled to device pixels of screenshot
+
+function rpa_page_crop(screenshot_data, snap_rects, screenshot_width) {
+
+    var screenshot_text = atob(screenshot_data); var screenshot_bytes = new Uint8Array(screenshot_text.length);
+    for (var byte_index = 0; byte_index < screenshot_text.length; byte_index++) screenshot_bytes[byte_index] = screenshot_text.charCodeAt(byte_index);
+
+    return createImageBitmap(new Blob([screenshot_bytes], {type: 'image/png'})).then(function(screenshot_image) {
+        var pixel_ratio = screenshot_image.width / screenshot_width;
+        return snap_rects.map(function(snap_rect) {
+            if (snap_rect === null) return null;
+            if (snap_rect.page) return screenshot_data;
+            var crop_left = Math.max(0, Math.round(snap_rect.x * pixel_ratio));
+            var crop_top = Math.max(0, Math.round(snap_rect.y * pixel_ratio));
+            var crop_width = Math.min(screenshot_image.width, Math.round((snap_rect.x + snap_rect.width) * pixel_ratio)) - crop_left;
+            var crop_height = Math.min(screenshot_image.height, Math.round((snap_rect.y + snap_rect.height) * pixel_ratio)) - crop_top;
+            if (crop_width <= 0 || crop_height <= 0) return null;
+            var crop_canvas = document.createElement('canvas'); crop_canvas.width = crop_width; crop_canvas.height = crop_height;
+            crop_canvas.getContext('2d').drawImage(screenshot_image, crop_left, crop_top, crop_width, crop_height, 0, 0, crop_width, crop_height);
+            return crop_canvas.toDataURL('image/png').split(',')[1];
+        });
+    });
+
+}
+
+// function to switch webpage context to main frame and sub frame in one instruction
+// frames found before are reused from cache in webpage, which navigation clears
+// result is true, or 'main' / 'sub' for the frame that is not found before timeout
+
+function rpa_frame(main_frame, sub_frame) {
+
+    chrome_context = 'document'; frame_step_offset_x = 0; frame_step_offset_y = 0;
+    var frame_names = []; if (main_frame !== '') {frame_names.push(main_frame); if (sub_frame !== '') frame_names.push(sub_frame);}
+    var frame_contexts = ['mainframe_context', 'subframe_context'];
+
+    var frame_expression = '(' + rpa_page_frame.toString() + ')(' + JSON.stringify(frame_names) + ')';
+    try {var frame_offset = JSON.parse(chrome_step('Runtime.evaluate', {expression: frame_expression, returnByValue: true})).result.result.value;}
+    catch (e) {var frame_offset = null;}
+    if (frame_names.length == 0) return true;
+
+    if (frame_offset !== null && typeof frame_offset === 'object') {
+        frame_step_offset_x = frame_offset.left; frame_step_offset_y = frame_offset.top;
+        chrome_context = frame_contexts[frame_names.length - 1]; return true;
+    }
+
+    for (var frame_index = 0; frame_index < frame_names.length; frame_index++) {
+        var frame_xpath = '(//frame|//iframe)[@name="' + frame_names[frame_index] + '" or @id="' + frame_names[frame_index] + '"]';
+        if (!exist(frame_xpath)) return ['main', 'sub'][frame_index];
+        var frame_rect = chrome.getRect(xps666(frame_xpath));
+        frame_step_offset_x = frame_rect.left; frame_step_offset_y = frame_rect.top;
+        chrome_step('Runtime.evaluate', {expression: frame_contexts[frame_index] + ' = document.evaluate(' + JSON.stringify(frame_xpath) + ',' +
+                    chrome_context + ',null,XPathResult.ORDERED_NODE_SNAPSHOT_TYPE,null).snapshotItem(0).contentDocument'});
+        chrome_context = frame_contexts[frame_index];
+    }
+
+    chrome_step('Runtime.evaluate', {expression: '(' + rpa_page_frame_cache.toString() + ')(' + JSON.stringify(frame_names) + ')'});
+    return true;
+
+}
+
+// function run in webpage to set frame contexts from cache, returns offset of
+// last frame in its parent frame, null if not cached or frame has been removed
+
+function rpa_page_frame(frame_names) {
+
+    mainframe_context = null; subframe_context = null;
+    if (typeof window.rpa_frames === 'undefined' || frame_names.length == 0) return null;
+    var frame_key = JSON.stringify(frame_names);
+    var frame_elements = window.rpa_frames[frame_key]; if (typeof frame_elements === 'undefined') return null;
+
+    for (var frame_index = 0; frame_index < frame_elements.length; frame_index++) {
+        if (!frame_elements[frame_index].isConnected || frame_elements[frame_index].contentDocument === null) {
+            delete window.rpa_frames[frame_key]; mainframe_context = null; subframe_context = null; return null;
+        }
+        if (frame_index == 0) mainframe_context = frame_elements[frame_index].contentDocument;
+        else subframe_context = frame_elements[frame_index].contentDocument;
+    }
+
+    var frame_rect = frame_elements[frame_elements.length - 1].getBoundingClientRect();
+    return {left: Math.round(frame_rect.left), top: Math.round(frame_rect.top)};
+
+}
+
+// function run in webpage to cache frame elements of frame contexts set by rpa_frame()
+
+function rpa_page_frame_cache(frame_names) {
+
+    if (typeof window.rpa_frames === 'undefined') window.rpa_frames = {};
+    var frame_elements = [mainframe_context.defaultView.frameElement];
+    if (frame_names.length > 1) frame_elements.push(subframe_context.defaultView.frameElement);
+    window.rpa_frames[JSON.stringify(frame_names)] = frame_elements;
+
+}
+
+// tabs opened by tab_open(), tab number to its chrome target and session, 0 is main tab
+
+var rpa_tabs = {0: {target: '', session: ''}}; var rpa_tab_count = 0; var rpa_tab_current = 0;
+
+// function to reset webpage context to main tab, detaching popup() tab if any
+
+function rpa_tab_reset() {
+
+    var found_targetid = chrome_targetid; chrome_targetid = ''; rpa_tab_current = 0;
+    chrome_context = 'document'; frame_step_offset_x = 0; frame_step_offset_y = 0;
+    for (var tab_number in rpa_tabs) if (rpa_tabs[tab_number].session === found_targetid) return;
+    chrome_step('Target.detachFromTarget', {sessionId: found_targetid});
+
+}
+
+// function to run chrome method on tab without switching to it, returns parsed json
+
+function rpa_tab_step(tab_number, tab_method, tab_params) {
+
+    var tab_targetid = chrome_targetid; chrome_targetid = rpa_tabs[tab_number].session;
+    try {var ws_json = JSON.parse(chrome_step(tab_method, tab_params));} catch (e) {var ws_json = {};}
+    chrome_targetid = tab_targetid; return ws_json;
+
+}
+
+// function to open tab in background with url and attach to it, returns tab number
+// result is null if tab cannot be opened, webpage context stays at current tab
+
+function rpa_tab_open(tab_url) {
+
+    var tab_setup = (rpa_blocked.length > 0 || rpa_state_source !== '');
+    var tab_json = rpa_tab_step(0, 'Target.createTarget', {url: tab_setup ? 'about:blank' : tab_url, background: true});
+    if (!tab_json.result || !tab_json.result.targetId) return null;
+    var tab_targetid = tab_json.result.targetId;
+
+    tab_json = rpa_tab_step(0, 'Target.attachToTarget', {targetId: tab_targetid});
+    if (!tab_json.result || !tab_json.result.sessionId) {rpa_tab_step(0, 'Target.closeTarget', {targetId: tab_targetid}); return null;}
+
+    rpa_tab_count++; rpa_tabs[rpa_tab_count] = {target: tab_targetid, session: tab_json.result.sessionId};
+
+    // url patterns from block() and storage from load_state() are set before tab loads url
+    if (tab_setup) {
+        if (rpa_blocked.length > 0) rpa_block_tab(rpa_tab_count);
+        if (rpa_state_source !== '') rpa_state_script(rpa_tab_count);
+        if (tab_url !== 'about:blank') rpa_tab_step(rpa_tab_count, 'Page.navigate', {url: tab_url});
+    }
+    return rpa_tab_count;
+
+}
+
+// function to set webpage context to tab, returns false if tab is not open
+
+function rpa_tab(tab_number) {
+
+    if (!rpa_tabs.hasOwnProperty(tab_number)) return false;
+    if (tab_number == rpa_tab_current && chrome_targetid === rpa_tabs[tab_number].session) return true;
+    rpa_tab_reset(); if (tab_number == 0) return true;
+
+    rpa_tab_step(0, 'Target.activateTarget', {targetId: rpa_tabs[tab_number].target});
+    chrome_targetid = rpa_tabs[tab_number].session; rpa_tab_current = tab_number; return true;
+
+}
+
+// function to go to url on tab without waiting for webpage to load, or return its url
+// result is null if tab is not open or url cannot be loaded
+
+function rpa_tab_url(tab_number, tab_url) {
+
+    if (!rpa_tabs.hasOwnProperty(tab_number)) return null;
+    if (tab_url === '') {
+        var tab_json = rpa_tab_step(tab_number, 'Runtime.evaluate', {expression: 'document.location.href', returnByValue: true});
+        try {return tab_json.result.result.value;} catch (e) {return null;}
+    }
+    var tab_json = rpa_tab_step(tab_number, 'Page.navigate', {url: tab_url});
+    if (!tab_json.result || tab_json.result.errorText) return null; return tab_url;
+
+}
+
+// function to close tab, setting webpage context to main tab if it is current tab
+
+function rpa_tab_close(tab_number) {
+
+    if (tab_number == 0 || !rpa_tabs.hasOwnProperty(tab_number)) return false;
+    if (tab_number == rpa_tab_current) rpa_tab_reset();
+    rpa_tab_step(0, 'Target.closeTarget', {targetId: rpa_tabs[tab_number].target});
+    delete rpa_tabs[tab_number]; return true;
+
+}
+
+// url patterns blocked by block() for main tab and tabs from tab_open()
+
+var rpa_blocked = [];
+
+// function to set url patterns to block on all tabs, returns false if a tab fails
+
+function rpa_block(block_patterns) {
+
+    rpa_blocked = block_patterns; var block_result = true;
+    for (var tab_number in rpa_tabs) if (!rpa_block_tab(tab_number)) block_result = false;
+    return block_result;
+
+}
+
+// function to set url patterns blocked by block() on tab
+
+function rpa_block_tab(tab_number) {
+
+    if (rpa_blocked.length > 0) rpa_tab_step(tab_number, 'Network.enable', {});
+    var block_json = rpa_tab_step(tab_number, 'Network.setBlockedURLs', {urls: rpa_blocked});
+    return (typeof block_json.result !== 'undefined');
+
+}
+
+// function to estimate requests blocked on current webpage, from elements with blocked urls not loaded
+
+function rpa_block_count() {
+
+    if (rpa_blocked.length == 0) return 0;
+    var block_expression = '(' + rpa_page_block_count.toString() + ')(' + JSON.stringify(rpa_blocked) + ')';
+    try {return JSON.parse(chrome_step('Runtime.evaluate', {expression: block_expression, returnByValue: true})).result.result.value || 0;}
+    catch (e) {return 0;}
+
+}
+
+// function run in webpage to count element urls matching any blocked pattern that did not load,
+// ie broken image or no resource timing with response, * in pattern matches any text like Network.setBlockedURLs
+
+function rpa_page_block_count(block_patterns) {
+
+    function rpa_match(block_url, block_pattern) {
+        var pattern_parts = block_pattern.split('*'); var url_position = 0;
+        for (var part_index = 0; part_index < pattern_parts.length; part_index++) {
+            var pattern_part = pattern_parts[part_index]; if (pattern_part === '') continue;
+            if (part_index == 0) {if (block_url.indexOf(pattern_part) !== 0) return false; url_position = pattern_part.length; continue;}
+            if (part_index == pattern_parts.length - 1) return block_url.length - pattern_part.length >= url_position &&
+                block_url.substr(block_url.length - pattern_part.length) === pattern_part;
+            url_position = block_url.indexOf(pattern_part, url_position); if (url_position === -1) return false;
+            url_position += pattern_part.length;
+        }
+        return pattern_parts.length > 1 || block_url === block_pattern;
+    }
+
+    // urls loaded with a response, eg before block() is used, are not counted as blocked
+    var loaded_urls = {}; var loaded_entries = performance.getEntriesByType('resource');
+    for (var entry_index = 0; entry_index < loaded_entries.length; entry_index++)
+        if (loaded_entries[entry_index].responseStart > 0) loaded_urls[loaded_entries[entry_index].name] = true;
+
+    var block_count = 0; var block_elements = document.querySelectorAll('img, script, link, video, audio, source, iframe, embed');
+    for (var element_index = 0; element_index < block_elements.length; element_index++) {
+        var block_element = block_elements[element_index];
+        var block_url = block_element.currentSrc || block_element.src || block_element.href;
+        if (typeof block_url !== 'string' || block_url === '') continue;
+        if (block_element.tagName == 'IMG') {if (!block_element.complete || block_element.naturalWidth > 0) continue;}
+        else if (loaded_urls[block_url]) continue;
+        for (var pattern_index = 0; pattern_index < block_patterns.length; pattern_index++)
+            if (rpa_match(block_url, block_patterns[pattern_index])) {block_count++; break;}
     }
+    return block_count;
+
+}
+
+// function to mark webpage before url() goes to new webpage, for rpa_wait_until()
 
+function rpa_navigate_mark() {
+
+    chrome_step('Runtime.evaluate', {expression: 'window.rpa_navigated = location.href'});
+
+}
+
+// function to wait until webpage is domcontentloaded, load or networkidle for idle_time ms,
+// webpage is checked again while it is marked by rpa_navigate_mark() or being replaced
+// navigate_url is url given to url(), null if there is no navigation to wait for
+// result is true as soon as webpage reaches the state, false if not before wait_time ms
+
+function rpa_wait_until(wait_until, idle_time, wait_time, navigate_url) {
+
+    var wait_timeout = Date.now() + wait_time;
+    while (Date.now() < wait_timeout) {
+        var wait_expression = '(' + rpa_page_wait_until.toString() + ')(' + JSON.stringify(wait_until) + ', ' +
+                              Math.round(idle_time) + ', ' + Math.max(0, wait_timeout - Date.now()) + ', ' + JSON.stringify(navigate_url) + ')';
+        try {var wait_result = JSON.parse(chrome_step('Runtime.evaluate', {expression: wait_expression, awaitPromise: true, returnByValue: true})).result.result.value;}
+        catch (e) {var wait_result = null;}
+        if (typeof wait_result === 'boolean') return wait_result;
+        sleep(100);
+    }
     return false;
 
 }
 
+// function run in webpage to resolve as soon as it reaches state, networkidle is when no
+// request finishes for idle_time ms after load, null if webpage is not navigated yet,
+// url differing from marked url only by #fragment stays on same webpage, so mark is cleared
+
+function rpa_page_wait_until(wait_until, idle_time, wait_time, navigate_url) {
+
+    if (window.rpa_navigated) {
+        try {var same_document = navigate_url !== null && new URL(navigate_url, location.href).hash !== '' &&
+             new URL(navigate_url, location.href).href.split('#')[0] === new URL(window.rpa_navigated).href.split('#')[0];}
+        catch (e) {var same_document = false;}
+        if (!same_document) return null;
+        delete window.rpa_navigated;
+    }
+
+    return new Promise(function(resolve) {
+        var wait_timer = setTimeout(function() {resolve(false);}, wait_time);
+        function rpa_reached() {clearTimeout(wait_timer); resolve(true);}
+
+        if (wait_until == 'domcontentloaded') {
+            if (document.readyState !== 'loading') rpa_reached();
+            else document.addEventListener('DOMContentLoaded', rpa_reached);
+            return;
+        }
+
+        function rpa_loaded() {
+            if (wait_until == 'load') {rpa_reached(); return;}
+            var idle_timer = null; var idle_observer = new PerformanceObserver(rpa_idle);
+            function rpa_idle() {
+                clearTimeout(idle_timer);
+                idle_timer = setTimeout(function() {idle_observer.disconnect(); rpa_reached();}, idle_time);
+            }
+            idle_observer.observe({entryTypes: ['resource']}); rpa_idle();
+        }
+
+        if (document.readyState === 'complete') rpa_loaded();
+        else window.addEventListener('load', rpa_loaded);
+    });
+
+}
+
+// script from load_state() to restore storage of its webpage origin, on each new webpage,
+// tab number to identifier of script added to tab, for removing it
+
+var rpa_state_source = ''; var rpa_state_scripts = {};
+
+// function to add script from load_state() to tab, for each new webpage of tab
+
+function rpa_state_script(tab_number) {
+
+    var script_json = rpa_tab_step(tab_number, 'Page.addScriptToEvaluateOnNewDocument', {source: rpa_state_source});
+    if (script_json.result && script_json.result.identifier) rpa_state_scripts[tab_number] = script_json.result.identifier;
+
+}
+
+// function to remove scripts from load_state(), storage already set in webpages stays
+
+function rpa_state_clear() {
+
+    for (var tab_number in rpa_state_scripts) if (rpa_tabs.hasOwnProperty(tab_number))
+        rpa_tab_step(tab_number, 'Page.removeScriptToEvaluateOnNewDocument', {identifier: rpa_state_scripts[tab_number]});
+    rpa_state_source = ''; rpa_state_scripts = {};
+
+}
+
+// function to return cookies of browser, and localStorage and sessionStorage of webpage
+// result is null if cookies cannot be read
+
+function rpa_save_state() {
+
+    try {var cookies_json = JSON.parse(chrome_step('Network.getAllCookies', {}));} catch (e) {return null;}
+    if (!cookies_json.result || !cookies_json.result.cookies) return null;
+
+    var storage_expression = '(' + rpa_page_storage.toString() + ')()';
+    try {var page_storage = JSON.parse(chrome_step('Runtime.evaluate', {expression: storage_expression, returnByValue: true})).result.result.value;}
+    catch (e) {var page_storage = null;}
+
+    return {cookies: cookies_json.result.cookies, origins: page_storage ? [page_storage] : []};
+
+}
+
+// function run in webpage to return its origin with localStorage and sessionStorage items
+
+function rpa_page_storage() {
+
+    function rpa_items(page_storage) {
+        var storage_items = {};
+        for (var item_index = 0; item_index < page_storage.length; item_index++)
+            storage_items[page_storage.key(item_index)] = page_storage.getItem(page_storage.key(item_index));
+        return storage_items;
+    }
+
+    try {return {origin: window.location.origin, local: rpa_items(window.localStorage), session: rpa_items(window.sessionStorage)};}
+    catch (e) {return null;}
+
+}
+
+// function to restore cookies and storage saved by rpa_save_state(), storage is set
+// on current webpage and on each new webpage of same origin, for items not yet set
+
+function rpa_load_state(browser_state) {
+
+    var state_cookies = browser_state.cookies.map(function(state_cookie) {
+        var cookie_param = {name: state_cookie.name, value: state_cookie.value, path: state_cookie.path,
+                            secure: state_cookie.secure, httpOnly: state_cookie.httpOnly};
+
+        // host-only cookie has domain without leading dot, it is set by url to stay host-only
+        // instead of becoming a domain cookie sent to all subdomains
+        if (state_cookie.domain.charAt(0) == '.') cookie_param.domain = state_cookie.domain;
+        else cookie_param.url = (state_cookie.secure ? 'https://' : 'http://') + state_cookie.domain + state_cookie.path;
+        if (state_cookie.sameSite) cookie_param.sameSite = state_cookie.sameSite;
+        if (!state_cookie.session && state_cookie.expires > 0) cookie_param.expires = state_cookie.expires;
+        return cookie_param;
+    });
+
+    var state_result = true;
+    if (state_cookies.length > 0) {
+        try {var cookies_json = JSON.parse(chrome_step('Network.setCookies', {cookies: state_cookies}));} catch (e) {var cookies_json = {};}
+        if (typeof cookies_json.result === 'undefined') state_result = false;
+    }
+
+    rpa_state_clear(); rpa_state_source = '(' + rpa_page_load_storage.toString() + ')(' + JSON.stringify(browser_state.origins) + ')';
+    for (var tab_number in rpa_tabs) {
+        rpa_state_script(tab_number);
+        rpa_tab_step(tab_number, 'Runtime.evaluate', {expression: rpa_state_source});
+    }
+    return state_result;
+
+}
+
+// function run in webpage to set storage items saved for its origin, if not yet set
+
+function rpa_page_load_storage(state_origins) {
+
+    for (var origin_index = 0; origin_index < state_origins.length; origin_index++) {
+        var state_origin = state_origins[origin_index]; if (state_origin.origin !== window.location.origin) continue;
+        try {
+            for (var local_key in state_origin.local)
+                if (window.localStorage.getItem(local_key) === null) window.localStorage.setItem(local_key, state_origin.local[local_key]);
+            for (var session_key in state_origin.session)
+                if (window.sessionStorage.getItem(session_key) === null) window.sessionStorage.setItem(session_key, state_origin.session[session_key]);
+        } catch (e) {}
+    }
+
+}
+
+// function to reset state changed by client of serve() daemon, so next client starts
+// like a new session - main tab, no frame, other tabs closed, no block() or load_state(),
+// and unless keep_cookies, no cookies and storage of origins with cookies or of current webpage
+
+function rpa_serve_reset(keep_cookies) {
+
+    rpa_tab_reset(); rpa_state_clear();
+    for (var tab_number in rpa_tabs) if (tab_number != 0) rpa_tab_close(tab_number);
+    if (rpa_blocked.length > 0) rpa_block([]);
+    if (keep_cookies) return true;
+
+    // storage of all origins cannot be cleared in one step, so origins are taken from cookies
+    var clear_origins = {};
+    try {
+        var clear_cookies = JSON.parse(chrome_step('Network.getAllCookies', {})).result.cookies;
+        for (var cookie_index = 0; cookie_index < clear_cookies.length; cookie_index++) {
+            var cookie_domain = clear_cookies[cookie_index].domain.replace(/^[.]/, '');
+            clear_origins['https://' + cookie_domain] = true; clear_origins['http://' + cookie_domain] = true;
+        }
+    } catch (e) {}
+    try {
+        var webpage_origin = JSON.parse(chrome_step('Runtime.evaluate', {expression: 'sessionStorage.clear(); location.origin', returnByValue: true})).result.result.value;
+        if (typeof webpage_origin === 'string' && webpage_origin.indexOf('http') === 0) clear_origins[webpage_origin] = true;
+    } catch (e) {}
+
+    for (var clear_origin in clear_origins) chrome_step('Storage.clearDataForOrigin', {origin: clear_origin, storageTypes: 'all'});
+    chrome_step('Network.clearBrowserCookies', {}); chrome_step('Page.navigate', {url: 'about:blank'});
+    return true;
+
+}
+
 // function to replace add_concat() in tagui_header.js
 // gain - echoing string with single and double quotes
 // loss - no text-like variables usage since Python env
@@ -124,34 +1084,115 @@ def _py23_write(input_text = None):
     if _python2_env(): return input_text.decode('utf-8')
     else: return input_text
 
-def _tagui_read():
-    """function to read from tagui process live mode interface"""
+def _tagui_reader(tagui_process = None, output_queue = None):
+    """function for reader thread to queue output lines from tagui process"""
     # readline instead of read, not expecting user input to tagui
-    global _process; return _py23_decode(_process.stdout.readline())
+    try:
+        for tagui_out in iter(tagui_process.stdout.readline, b''):
+            output_queue.put(_py23_decode(tagui_out))
+    except Exception as e:
+        pass
+    # None marks end of output when tagui process has ended
+    output_queue.put(None)
+
+def _tagui_read(wait_deadline = None):
+    """function to read from tagui process live mode interface"""
+    # block on queue filled by reader thread instead of spinning on the pipe
+    # return None if deadline is reached and '' if tagui process has ended
+    _tagui_output_queue = _session()._tagui_output_queue
+    try:
+        if wait_deadline is None:
+            tagui_out = _tagui_output_queue.get()
+        else:
+            tagui_out = _tagui_output_queue.get(True, max(0.0, wait_deadline - time.time()))
+    except queue.Empty:
+        return None
+
+    if tagui_out is None:
+        _tagui_output_queue.put(None); return ''
+    return tagui_out
+
+def _tagui_deadline_time():
+    """function to get time by which tagui should respond, None for no limit"""
+    tagui_deadline = _session()._tagui_deadline
+    if tagui_deadline > 0: return time.time() + tagui_deadline
+    else: return None
+
+def _cpu_time():
+    """function for python 2 and 3 cpu time compatibility handling, of calling thread where available"""
+    # cpu time of process would include other threads, eg other sessions of Pool()
+    if hasattr(time, 'thread_time'): return time.thread_time()
+    return sum(os.times()[:2])
+
+def _session():
+    """function to get tagui session used by module functions in current thread"""
+    if getattr(_tagui_current, 'sessions', None): return _tagui_current.sessions[-1]
+    else: return _tagui_session
+
+def _session_method(session_function = None):
+    """function to wrap module function as session method, running it on that session"""
+    def session_method(self, *args, **kwargs):
+        with self: return session_function(*args, **kwargs)
+    session_method.__name__ = session_function.__name__
+    session_method.__doc__ = session_function.__doc__
+    return session_method
+
+def _tagui_ended(tagui_session = None):
+    """function to reset session flags and tracking when its tagui process ends"""
+    tagui_session._tagui_visual = False
+    tagui_session._tagui_chrome = False
+    tagui_session._tagui_browser = False
+    tagui_session._tagui_started = False
+    with _tagui_sessions_lock:
+        if tagui_session in _tagui_sessions: _tagui_sessions.remove(tagui_session)
+
+def _tagui_cleanup(tagui_session = None):
+    """function to end session when init() fails or its tagui process is gone, removing its files"""
+    # marker file is only written by init() when no other session is running
+    with _tagui_sessions_lock:
+        if _tagui_sessions == [tagui_session] and os.path.isfile(_tagui_marker()):
+            os.remove(_tagui_marker())
+    _tagui_ended(tagui_session)
+
+    # private temp directory is kept in debug mode, like close() does
+    if not debug() and tagui_session._working_directory is None and \
+    tagui_session._tagui_directory != '' and os.path.isdir(tagui_session._tagui_directory):
+        shutil.rmtree(tagui_session._tagui_directory, True)
+    return False
 
 def _tagui_write(input_text = ''):
     """function to write to tagui process live mode interface"""
-    global _process; _process.stdin.write(_py23_encode(input_text))
-    _process.stdin.flush(); # flush to ensure immediate delivery
+    tagui_process = _session()._process
+    tagui_process.stdin.write(_py23_encode(input_text))
+    tagui_process.stdin.flush(); # flush to ensure immediate delivery
 
 def _tagui_output():
     """function to wait for tagui output file to read and delete it"""
-    global _tagui_delay, _tagui_init_directory
+    global _tagui_delay
+    tagui_session = _session()
 
     # to handle user changing current directory after init() is called
-    init_directory_output_file = os.path.join(_tagui_init_directory, 'rpa_python.txt')
+    init_directory_output_file = os.path.join(tagui_session._tagui_init_directory, 'rpa_python.txt')
+
+    # session in its own directory does not use rpa_python.txt in current directory
+    current_directory_output_file = 'rpa_python.txt'
+    if tagui_session._tagui_directory != '': current_directory_output_file = init_directory_output_file
 
-    # sleep to not splurge cpu cycles in while loop
-    while not os.path.isfile('rpa_python.txt'):
+    # sleep to not splurge cpu cycles in while loop, until deadline() if set
+    wait_deadline = _tagui_deadline_time()
+    while not os.path.isfile(current_directory_output_file):
         if os.path.isfile(init_directory_output_file): break
+        if wait_deadline is not None and time.time() > wait_deadline:
+            show_error('[RPA][ERROR] - TagUI did not write rpa_python.txt within ' + str(tagui_session._tagui_deadline) + ' seconds')
+            return ''
         time.sleep(_tagui_delay) 
 
     # roundabout implementation to ensure backward compatibility
-    if os.path.isfile('rpa_python.txt'):
-        tagui_output_file = _py23_open('rpa_python.txt', 'r')
+    if os.path.isfile(current_directory_output_file):
+        tagui_output_file = _py23_open(current_directory_output_file, 'r')
         tagui_output_text = _py23_read(tagui_output_file.read())
         tagui_output_file.close()
-        os.remove('rpa_python.txt')
+        os.remove(current_directory_output_file)
     else:
         tagui_output_file = _py23_open(init_directory_output_file, 'r')
         tagui_output_text = _py23_read(tagui_output_file.read())
@@ -160,6 +1201,116 @@ def _tagui_output():
 
     return tagui_output_text
 
+def _tagui_fetch(tagui_variable = ''):
+    """function to get tagui variable as text in-band, or with rpa_python.txt if inband(False)"""
+    tagui_session = _session()
+
+    # send instructions queued by batch() first, as result is needed now
+    if not _batch_flush(): return ''
+
+    # result line is framed with instruction id and read by _ready() on same pipe,
+    # no fallback to dump if result is missing, as that runs the expression again
+    if tagui_session._tagui_inband:
+        result_id = tagui_session._tagui_id
+        if not send_many(['js rpa_result(' + str(result_id) + ', String(' + tagui_variable + '))']): return ''
+        if result_id in tagui_session._tagui_results:
+            return _py23_read(json.loads(tagui_session._tagui_results.pop(result_id)))
+        show_error('[RPA][ERROR] - no result from TagUI for - ' + tagui_variable)
+        return ''
+
+    # dump to file for eg older tagui, expression is set to variable first to dump plain variable
+    if not re.match(r'^[A-Za-z_$][A-Za-z0-9_$]*$', tagui_variable):
+        if not send('js fetch_result = ' + tagui_variable): return ''
+        tagui_variable = 'fetch_result'
+    if not send_many(['dump ' + tagui_variable + ' to rpa_python.txt']): return ''
+    return _tagui_output()
+
+def _tagui_fused(fused_action = None, element_identifier = None, timeout_in_seconds = None):
+    """function to wait for web element and act on it in one round-trip, None if not fused, text for read"""
+    tagui_session = _session()
+
+    # fused mode needs in-band results and web element on chrome browser
+    if not tagui_session._tagui_inband or not tagui_session._tagui_chrome: return None
+    if element_identifier.lower() in ['page', 'page.png', 'page.bmp']: return None
+    if element_identifier.lower().endswith('.png') or element_identifier.lower().endswith('.bmp'): return None
+    if element_identifier.startswith('(') and element_identifier.endswith(')') and \
+       not any(c.isalpha() for c in element_identifier): return None
+
+    # send instructions queued by batch() first, to keep order of actions
+    if not _batch_flush(): return False
+
+    result_id = tagui_session._tagui_id; fused_start = time.time()
+    strategy_found = json.dumps(tagui_session._tagui_strategies.get(element_identifier))
+    if not send_many(['js rpa_fused(' + str(result_id) + ', \'' + fused_action + '\', \'' + _sdq(element_identifier) + '\', ' +
+                      strategy_found + ', ' + _wait_time(element_identifier, timeout_in_seconds) + ')']): return False
+    if result_id in tagui_session._tagui_results:
+        fused_result = json.loads(tagui_session._tagui_results.pop(result_id))
+        if fused_result is None:
+            tagui_session._tagui_strategies.pop(element_identifier, None)
+            show_error('[RPA][ERROR] - cannot find ' + element_identifier)
+            return False
+        if _strategy_cacheable(element_identifier): tagui_session._tagui_strategies[element_identifier] = fused_result[0]
+        _wait_record(element_identifier, time.time() - fused_start)
+        if fused_action == 'read': return _py23_read(fused_result[1])
+        return True
+
+    # no fallback to check and act on element separately, as action may have been done
+    show_error('[RPA][ERROR] - no result from TagUI for ' + fused_action + '() on ' + element_identifier)
+    return False
+
+def _wait_time(element_identifier = '', timeout_in_seconds = None):
+    """function to return milliseconds to wait for element as javascript, 'null' for timeout()"""
+    if timeout_in_seconds is not None: return str(int(float(timeout_in_seconds) * 1000))
+
+    # adaptive wait is capped at twice the percentile of recent wait times, from 5 waits
+    tagui_session = _session()
+    if tagui_session._tagui_adaptive is None: return 'null'
+    wait_times = sorted(tagui_session._tagui_latencies.get(element_identifier, []))
+    if len(wait_times) < 5: return 'null'
+    wait_index = min(len(wait_times) - 1, int(len(wait_times) * tagui_session._tagui_adaptive / 100.0))
+    wait_time = min(max(wait_times[wait_index] * 2, _tagui_delay), tagui_session._tagui_timeout)
+    return str(int(wait_time * 1000))
+
+def _wait_record(element_identifier = '', wait_time = 0.0):
+    """function to record wait time for element found, for adaptive wait of next checks"""
+    tagui_session = _session()
+    if tagui_session._tagui_adaptive is None: return
+    if element_identifier not in tagui_session._tagui_latencies:
+        tagui_session._tagui_latencies[element_identifier] = collections.deque(maxlen = 100)
+    tagui_session._tagui_latencies[element_identifier].append(wait_time)
+
+def _strategy_cacheable(element_identifier = ''):
+    """function to check if strategy found for web identifier can be kept, eg not xpath"""
+    if element_identifier.startswith('/') or element_identifier.startswith('('): return False
+    if element_identifier.lower().endswith('.png') or element_identifier.lower().endswith('.bmp'): return False
+    # number is nth table for table(), which tagui resolves itself instead of matching text
+    if element_identifier.isdigit(): return False
+    return element_identifier.lower() != 'page'
+
+def _strategy(element_identifier = ''):
+    """function to return xpath of strategy found by exist() for identifier, for next step"""
+    strategy_found = _session()._tagui_strategies.get(element_identifier)
+    if strategy_found is None: return _visual_file(element_identifier)
+    return strategy_found[0]
+
+def _visual_file(element_identifier = ''):
+    """function to resolve image identifier from current directory for session in its own directory"""
+    if element_identifier.lower() in ['page.png', 'page.bmp']: return element_identifier
+    if element_identifier.lower().endswith('.png') or element_identifier.lower().endswith('.bmp'):
+        return _abs_file(element_identifier)
+    return element_identifier
+
+def _tagui_eval(javascript_expression = ''):
+    """function to get result of javascript expression as text in one round-trip where possible"""
+    # in-band result is fetched with expression itself, else _tagui_fetch() sets variable to dump to file
+    return _tagui_fetch(javascript_expression)
+
+def inband(on_off = None):
+    """function to set mode to return results in-band instead of rpa_python.txt"""
+    tagui_session = _session()
+    if on_off is not None: tagui_session._tagui_inband = on_off
+    return tagui_session._tagui_inband
+
 def _esq(input_text = ''):
     """function for selective escape of single quote ' for tagui"""
     # [BACKSLASH_QUOTE] marker to work together with send()
@@ -170,19 +1321,25 @@ def _sdq(input_text = ''):
     # change identifier single quote ' to double quote "
     return input_text.replace("'",'"')
 
+def _abs_file(filename = ''):
+    """function to resolve filename from current directory for session in its own directory"""
+    # tagui resolves relative filename from its working directory instead
+    if _session()._tagui_directory != '': return os.path.abspath(filename)
+    else: return filename
+
 def _started():
-    global _tagui_started; return _tagui_started
+    return _session()._tagui_started
 
 def _visual():
-    global _tagui_visual; return _tagui_visual
+    return _session()._tagui_visual
 
 def _chrome():
-    global _tagui_chrome; return _tagui_chrome
+    return _session()._tagui_chrome
 
 def _python_flow():
     """function to create entry tagui flow without visual automation"""
     flow_text = '// NORMAL ENTRY FLOW FOR RPA FOR PYTHON ~ TEBEL.ORG\r\n\r\nlive'
-    flow_file = _py23_open('rpa_python', 'w')
+    flow_file = _py23_open(os.path.join(_session()._tagui_directory, 'rpa_python'), 'w')
     flow_file.write(_py23_write(flow_text))
     flow_file.close()
 
@@ -190,14 +1347,17 @@ def _visual_flow():
     """function to create entry tagui flow with visual automation"""
     flow_text = '// VISUAL ENTRY FLOW FOR RPA FOR PYTHON ~ TEBEL.ORG\r\n' + \
                 '// mouse_xy() - dummy trigger for SikuliX integration\r\n\r\nlive'
-    flow_file = _py23_open('rpa_python', 'w')
+    flow_file = _py23_open(os.path.join(_session()._tagui_directory, 'rpa_python'), 'w')
     flow_file.write(_py23_write(flow_text))
     flow_file.close()
 
-def _tagui_local():
+def _tagui_local(chrome_browser = False):
     """function to create tagui_local.js for custom local functions"""
     global _tagui_local_js
-    javascript_file = _py23_open('tagui_local.js', 'w')
+    javascript_file = _py23_open(os.path.join(_session()._tagui_directory, 'tagui_local.js'), 'w')
+    # flag for custom functions to use chrome_step(), which is only for chrome browser
+    if chrome_browser: javascript_file.write(_py23_write('var rpa_chrome = true;\n\n'))
+    else: javascript_file.write(_py23_write('var rpa_chrome = false;\n\n'))
     javascript_file.write(_py23_write(_tagui_local_js))
     javascript_file.close()
 
@@ -228,6 +1388,183 @@ def _tagui_delta(base_directory = None):
     delta_done_file.close()
     return True
 
+def _atomic_dump(text_to_dump = None, filename_to_save = None):
+    """function to save text to file atomically, so other processes never read partial file"""
+    temp_handle, temp_filename = tempfile.mkstemp(prefix = '.rpa_python_', dir = os.path.dirname(os.path.abspath(filename_to_save)))
+    os.close(temp_handle)
+    dump(text_to_dump, temp_filename)
+    # keep permissions of file replaced, eg executable tagui files, instead of 0600 of temp file
+    if os.path.isfile(filename_to_save): shutil.copymode(filename_to_save, temp_filename)
+    if hasattr(os, 'replace'):
+        os.replace(temp_filename, filename_to_save)
+    else:
+        if platform.system() == 'Windows' and os.path.isfile(filename_to_save): os.remove(filename_to_save)
+        os.rename(temp_filename, filename_to_save)
+    return True
+
+def _tagui_patch(tagui_directory = None, turbo_mode = False):
+    """function to patch tagui files for turbo or normal mode, only if mode or file changed"""
+
+    tagui_chrome_php = tagui_directory + '/' + 'src' + '/' + 'tagui_chrome.php'
+    tagui_header_js = tagui_directory + '/' + 'src' + '/' + 'tagui_header.js'
+    tagui_sikuli_py = tagui_directory + '/' + 'src' + '/' + 'tagui.sikuli/tagui.py'
+
+    # text replacements from turbo to normal mode, reversed for turbo mode to run 10X faster
+    mode_patches = {tagui_chrome_php: [('$scan_period = 10000;', '$scan_period = 100000;')],
+                      tagui_header_js: [('function sleep(ms) {ms *= 0.1; //', 'function sleep(ms) { //'),
+                                        ("chrome_step('Input.insertText',{text: value});};", "for (var character = 0, length = value.length; character < length; character++) {\nchrome_step('Input.dispatchKeyEvent',{type: 'char', text: value[character]});}};")],
+                      tagui_sikuli_py: [('scan_period = 0.05\n\n# teleport mouse instead of moving to target\nSettings.MoveMouseDelay = 0', 'scan_period = 0.5')]}
+
+    if turbo_mode: patch_mode = 'turbo'
+    else: patch_mode = 'normal'
+
+    # manifest tracks mode, hash, size and mtime of each patched file, to skip reading
+    # file when its size and mtime are unchanged, and to skip rewriting it when its hash is
+    patch_manifest_file = tagui_directory + '/' + 'rpa_python_patched'
+    try:
+        patch_manifest = json.loads(load(patch_manifest_file)) if os.path.isfile(patch_manifest_file) else {}
+    except ValueError:
+        patch_manifest = {}
+
+    manifest_changed = False
+    for patch_file in [tagui_chrome_php, tagui_header_js, tagui_sikuli_py]:
+        if not os.path.isfile(patch_file): continue
+        manifest_key = os.path.relpath(patch_file, tagui_directory)
+        manifest_entry = patch_manifest.get(manifest_key, {})
+        patch_stat = os.stat(patch_file)
+        if manifest_entry.get('mode') == patch_mode and manifest_entry.get('size') == patch_stat.st_size \
+        and manifest_entry.get('mtime') == patch_stat.st_mtime: continue
+
+        original_text = load(patch_file); patch_text = original_text
+        patch_hash = hashlib.sha1(_py23_encode(_py23_write(patch_text))).hexdigest()
+        if manifest_entry.get('mode') == patch_mode and manifest_entry.get('hash') == patch_hash:
+            manifest_entry.update({'size': patch_stat.st_size, 'mtime': patch_stat.st_mtime})
+            patch_manifest[manifest_key] = manifest_entry; manifest_changed = True; continue
+
+        for turbo_text, normal_text in mode_patches[patch_file]:
+            if turbo_mode: patch_text = patch_text.replace(normal_text, turbo_text)
+            else: patch_text = patch_text.replace(turbo_text, normal_text)
+
+        # atomic rewrite so parallel init() never sees a partially written file
+        if patch_text != original_text:
+            try:
+                _atomic_dump(patch_text, patch_file)
+            except Exception as e:
+                show_error('[RPA][ERROR] - cannot patch ' + patch_file + ' - ' + str(e))
+                return False
+
+        patch_stat = os.stat(patch_file)
+        patch_manifest[manifest_key] = {'mode': patch_mode, 'hash': hashlib.sha1(_py23_encode(_py23_write(patch_text))).hexdigest(),
+                                        'size': patch_stat.st_size, 'mtime': patch_stat.st_mtime}
+        manifest_changed = True
+
+    if manifest_changed:
+        try:
+            _atomic_dump(json.dumps(patch_manifest), patch_manifest_file)
+        except Exception as e:
+            pass
+
+    return True
+
+def _tagui_install_directory():
+    """function to get tagui folder within location of TagUI installation"""
+    if platform.system() == 'Windows':
+        return tagui_location() + '/' + 'tagui'
+    else:
+        return tagui_location() + '/' + '.tagui'
+
+def _which(executable_name = None):
+    """function to find executable on PATH without spawning a shell, '' if not found"""
+    if platform.system() == 'Windows':
+        executable_extensions = [''] + os.environ.get('PATHEXT', '.EXE').lower().split(';')
+    else:
+        executable_extensions = ['']
+    for path_folder in os.environ.get('PATH', '').split(os.pathsep):
+        for executable_extension in executable_extensions:
+            executable_file = os.path.join(path_folder.strip('"'), executable_name + executable_extension)
+            if os.path.isfile(executable_file) and os.access(executable_file, os.X_OK): return executable_file
+    return ''
+
+def _chrome_binary():
+    """function to find chrome web browser used by tagui, '' if not found"""
+    if platform.system() == 'Windows':
+        for chrome_file in [os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)') + '\\Google\\Chrome\\Application\\chrome.exe',
+                            os.environ.get('ProgramFiles', 'C:\\Program Files') + '\\Google\\Chrome\\Application\\chrome.exe',
+                            os.environ.get('LOCALAPPDATA', '') + '\\Google\\Chrome\\Application\\chrome.exe']:
+            if os.path.isfile(chrome_file): return chrome_file
+        return ''
+    elif platform.system() == 'Darwin':
+        chrome_file = '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'
+        if os.path.isfile(chrome_file): return chrome_file
+        return ''
+    else:
+        return _which('google-chrome') or _which('chromium-browser') or _which('chromium')
+
+def _tagui_probe(tagui_directory = None, refresh = False, sikulix_warmup = False):
+    """function to check java, sikulix, php and chrome once and cache results for next init()"""
+
+    sikulix_folder = tagui_directory + '/' + 'src' + '/' + 'sikulix'
+    java_binary = _which('java')
+    if platform.system() == 'Windows' and os.path.isfile(tagui_directory + '/' + 'src' + '/' + 'php' + '/' + 'php.exe'):
+        php_binary = tagui_directory + '/' + 'src' + '/' + 'php' + '/' + 'php.exe'
+    else:
+        php_binary = _which('php')
+    chrome_binary = _chrome_binary()
+
+    # cache is valid as long as installation, PATH and binaries are unchanged
+    probe_files = [java_binary, php_binary, chrome_binary, sikulix_folder + '/' + 'sikulix.jar',
+                    sikulix_folder + '/' + 'jython-standalone-2.7.1.jar']
+    probe_mtimes = [os.path.getmtime(probe_file) if probe_file != '' and os.path.isfile(probe_file) else 0
+                    for probe_file in probe_files]
+    probe_key = hashlib.sha1(_py23_encode(json.dumps([os.path.abspath(tagui_directory),
+                    os.environ.get('PATH', ''), probe_files, probe_mtimes]))).hexdigest()
+
+    probe_file = tagui_directory + '/' + 'rpa_python_probe'
+    try:
+        probe_cache = json.loads(load(probe_file)) if os.path.isfile(probe_file) else {}
+    except ValueError:
+        probe_cache = {}
+
+    if not refresh and probe_cache.get('key') == probe_key:
+        probe_result = probe_cache['probe']
+    else:
+        # capture java -version output directly instead of via java_version.txt
+        java_version_info = ''; java_installed = False
+        if java_binary != '':
+            try:
+                java_process = subprocess.Popen([java_binary, '-version'], stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+                java_version_info = _py23_decode(java_process.communicate()[0]).lower()
+                java_installed = java_process.returncode == 0
+            except Exception as e:
+                java_installed = False
+
+        probe_result = {'java': java_installed,
+                        'java_64bit': java_installed and ('64 bit' in java_version_info or '64-bit' in java_version_info),
+                        'sikulix_ready': False, 'php': php_binary != '', 'chrome': chrome_binary != ''}
+
+    # start a dummy first run if never run before, to let sikulix integrate jython
+    if sikulix_warmup and probe_result['java_64bit'] and not probe_result['sikulix_ready']:
+        if os.path.isfile(sikulix_folder + '/' + 'jython-standalone-2.7.1.jar'):
+            try:
+                with open(os.devnull, 'w') as shell_silencer:
+                    subprocess.call([java_binary, '-jar', sikulix_folder + '/' + 'sikulix.jar', '-h'],
+                                    stdout = shell_silencer, stderr = shell_silencer)
+            except Exception as e:
+                pass
+        probe_result['sikulix_ready'] = True
+
+    if probe_cache != {'key': probe_key, 'probe': probe_result}:
+        try:
+            _atomic_dump(json.dumps({'key': probe_key, 'probe': probe_result}), probe_file)
+        except Exception as e:
+            pass
+
+    return probe_result
+
+def _tagui_marker():
+    """function to get marker file which exists while tagui processes are running"""
+    return _tagui_install_directory() + '/' + 'rpa_python_running'
+
 def _patch_macos_pjs():
     """patch PhantomJS to latest v2.1.1 that plays well with new macOS versions"""
     if platform.system() == 'Darwin' and not os.path.isdir(tagui_location() + '/.tagui/src/phantomjs_old'):
@@ -278,6 +1615,53 @@ def error(on_off = None):
     if on_off is not None: _tagui_error = on_off
     return _tagui_error
 
+def deadline(deadline_in_seconds = None):
+    """function to set max seconds to wait for tagui response, 0 for no limit"""
+    tagui_session = _session()
+    if deadline_in_seconds is not None: tagui_session._tagui_deadline = float(deadline_in_seconds)
+    return tagui_session._tagui_deadline
+
+def measure(on_off = None):
+    """function to set measure mode, eg record wait time and cpu time per instruction"""
+    tagui_session = _session()
+    if on_off is not None:
+        if on_off: tagui_session._tagui_measure = []
+        else: tagui_session._tagui_measure = None
+        return True
+    if tagui_session._tagui_measure is None: return []
+    else: return list(tagui_session._tagui_measure)
+
+def phases(log_file = None):
+    """function to return timing of init() and close() phases, or set file to log them"""
+    tagui_session = _session()
+    if log_file is not None: tagui_session._tagui_phases_log = log_file; return True
+    tagui_phases = tagui_session._tagui_phases
+    return {'init': list(tagui_phases['init']), 'close': list(tagui_phases['close'])}
+
+def _tagui_phase(stage_name = None, phase_name = None, phase_start = None):
+    """function to record time taken by phase of init() or close(), returns start of next phase"""
+    phase_end = time.time()
+    _session()._tagui_phases[stage_name].append({'phase': phase_name, 'seconds': round(phase_end - phase_start, 3)})
+    return phase_end
+
+def _tagui_phases_dump(stage_name = None, stage_start = None):
+    """function to append timing of init() or close() phases to log file as json line"""
+    tagui_phases_log = _session()._tagui_phases_log
+    if tagui_phases_log == '': return True
+    phases_record = {'stage': stage_name, 'started': round(stage_start, 3),
+                     'seconds': round(time.time() - stage_start, 3),
+                     'phases': _session()._tagui_phases[stage_name],
+                     'version': __version__, 'python': platform.python_version(),
+                     'system': platform.system(), 'host': platform.node()}
+    try:
+        with _tagui_phases_lock:
+            phases_log_file = _py23_open(tagui_phases_log, 'a')
+            phases_log_file.write(_py23_write(json.dumps(phases_record) + '\n'))
+            phases_log_file.close()
+        return True
+    except Exception as e:
+        return False
+
 def show_error(error_message = None):
     """function to raise exception with given message"""
     if error_message is None:
@@ -315,6 +1699,14 @@ def unzip(file_to_unzip = None, unzip_location = None):
     zip_file.close()
     return True
 
+def doctor():
+    """function to refresh cached checks of java, sikulix, php and chrome used by init()"""
+    tagui_directory = _tagui_install_directory()
+    if not os.path.isdir(tagui_directory):
+        show_error('[RPA][ERROR] - TagUI is not installed, use setup() or init() to install')
+        return None
+    return _tagui_probe(tagui_directory, True, True)
+
 def setup():
     """function to setup TagUI to user home folder on Linux / macOS / Windows"""
 
@@ -468,26 +1860,39 @@ def setup():
 
     return True
 
-def init(visual_automation = False, chrome_browser = True, headless_mode = False, turbo_mode = False):
+def init(visual_automation = False, chrome_browser = True, headless_mode = False, turbo_mode = False, attach = None):
     """start and connect to tagui process by checking tagui live mode readiness"""
 
-    global _process, _tagui_started, _tagui_id, _tagui_visual, _tagui_chrome, _tagui_init_directory, _tagui_download_directory
+    tagui_session = _session()
 
-    if _tagui_started:
+    if tagui_session._tagui_started:
         show_error('[RPA][ERROR] - use close() before using init() again')
         return False
 
+    # reset timing of init() phases, each phase ends with _tagui_phase()
+    tagui_session._tagui_phases['init'] = []
+    init_start = phase_start = time.time()
+
+    # connect to tagui process of serve() daemon instead of starting one
+    if attach is not None and attach != '':
+        if not _tagui_attach(attach): return False
+        _tagui_phase('init', 'attach', phase_start)
+        _tagui_phases_dump('init', init_start); return True
+
     # reset id to track instruction count from rpa python to tagui
-    _tagui_id = 0
+    tagui_session._tagui_id = 0
+
+    # reset in-band results received from previous tagui session
+    tagui_session._tagui_results.clear()
+
+    # reset strategies found for identifiers in previous tagui session
+    tagui_session._tagui_strategies.clear()
 
     # reset variable to track original directory when init() was called
-    _tagui_init_directory = ''
+    tagui_session._tagui_init_directory = ''
 
     # get user home folder location to locate tagui executable
-    if platform.system() == 'Windows':
-        tagui_directory = tagui_location() + '/' + 'tagui'
-    else:
-        tagui_directory = tagui_location() + '/' + '.tagui'
+    tagui_directory = _tagui_install_directory()
 
     tagui_executable = tagui_directory + '/' + 'src' + '/' + 'tagui'
     end_processes_executable = tagui_directory + '/' + 'src' + '/' + 'end_processes'
@@ -497,50 +1902,43 @@ def init(visual_automation = False, chrome_browser = True, headless_mode = False
         if not setup():
             # error message is shown by setup(), no need for message here
             return False
+        phase_start = _tagui_phase('init', 'setup', phase_start)
 
     # sync tagui delta files for current release if needed
     if not _tagui_delta(tagui_directory): return False
+    phase_start = _tagui_phase('init', 'delta', phase_start)
 
     # on macOS, patch PhantomJS to latest v2.1.1 to solve OpenSSL issue
     if platform.system() == 'Darwin' and not _patch_macos_pjs(): return False
     # newer macOS has no python command, patch some files header to python3
     if platform.system() == 'Darwin' and not _patch_macos_py3(): return False
+    if platform.system() == 'Darwin': phase_start = _tagui_phase('init', 'macos_patch', phase_start)
+
+    # set working directory of tagui process for its generated files,
+    # private temp directory is removed by _tagui_cleanup() if init() fails after this
+    if tagui_session._working_directory is None:
+        tagui_session._tagui_directory = tempfile.mkdtemp(prefix = 'rpa_python_')
+    else:
+        tagui_session._tagui_directory = tagui_session._working_directory
 
     # create entry flow to launch SikuliX accordingly
     if visual_automation:
-        # check for working java jdk for visual automation mode
-        if platform.system() == 'Windows':
-            shell_silencer = '> nul 2>&1'
-        else:
-            shell_silencer = '> /dev/null 2>&1'
-
-        # check whether java is installed on the computer
-        if os.system('java -version ' + shell_silencer) != 0:
+        # check for working 64-bit java jdk required by sikulix, cached across init()
+        tagui_probe = _tagui_probe(tagui_directory, False, True)
+        if not tagui_probe['java_64bit']:
             print('[RPA][INFO] - to use visual automation mode, OpenJDK v8 (64-bit) or later is required')
             print('[RPA][INFO] - download from Amazon Corretto\'s website - https://aws.amazon.com/corretto')
             print('[RPA][INFO] - OpenJDK is preferred over Java JDK which is free for non-commercial use only')
-            return False
+            print('[RPA][INFO] - after installing, use doctor() to check again for Java')
+            return _tagui_cleanup(tagui_session)
         else:
-            # then check whether it is 64-bit required by sikulix
-            os.system('java -version > java_version.txt 2>&1')
-            java_version_info = load('java_version.txt').lower()
-            os.remove('java_version.txt')
-            if '64 bit' not in java_version_info and '64-bit' not in java_version_info:
-                print('[RPA][INFO] - to use visual automation mode, OpenJDK v8 (64-bit) or later is required')
-                print('[RPA][INFO] - download from Amazon Corretto\'s website - https://aws.amazon.com/corretto')
-                print('[RPA][INFO] - OpenJDK is preferred over Java JDK which is free for non-commercial use only')
-                return False
-            else:
-                # start a dummy first run if never run before, to let sikulix integrate jython 
-                sikulix_folder = tagui_directory + '/' + 'src' + '/' + 'sikulix'
-                if os.path.isfile(sikulix_folder + '/' + 'jython-standalone-2.7.1.jar'):
-                    os.system('java -jar "' + sikulix_folder + '/' + 'sikulix.jar" -h ' + shell_silencer)
-                _visual_flow()
+            phase_start = _tagui_phase('init', 'java_probe', phase_start)
+            _visual_flow()
     else:
         _python_flow()
 
     # create tagui_local.js for custom functions
-    _tagui_local()
+    _tagui_local(chrome_browser or headless_mode)
 
     # invoke web browser accordingly with tagui option
     browser_option = ''
@@ -549,94 +1947,134 @@ def init(visual_automation = False, chrome_browser = True, headless_mode = False
     if headless_mode:
         browser_option = 'headless'
 
+    phase_start = _tagui_phase('init', 'flow', phase_start)
+
     # special handling for turbo mode to run 10X faster
-    tagui_chrome_php = tagui_directory + '/' + 'src' + '/' + 'tagui_chrome.php'
-    tagui_header_js = tagui_directory + '/' + 'src' + '/' + 'tagui_header.js'
-    tagui_sikuli_py = tagui_directory + '/' + 'src' + '/' + 'tagui.sikuli/tagui.py'
-    if not turbo_mode:
-        dump(load(tagui_chrome_php).replace('$scan_period = 10000;', '$scan_period = 100000;'), tagui_chrome_php)
-        dump(load(tagui_header_js).replace('function sleep(ms) {ms *= 0.1; //', 'function sleep(ms) { //').replace("chrome_step('Input.insertText',{text: value});};", "for (var character = 0, length = value.length; character < length; character++) {\nchrome_step('Input.dispatchKeyEvent',{type: 'char', text: value[character]});}};"), tagui_header_js)
-        dump(load(tagui_sikuli_py).replace('scan_period = 0.05\n\n# teleport mouse instead of moving to target\nSettings.MoveMouseDelay = 0', 'scan_period = 0.5'), tagui_sikuli_py)
-    else:
-        dump(load(tagui_chrome_php).replace('$scan_period = 100000;', '$scan_period = 10000;'), tagui_chrome_php)
-        dump(load(tagui_header_js).replace('function sleep(ms) { //', 'function sleep(ms) {ms *= 0.1; //').replace("for (var character = 0, length = value.length; character < length; character++) {\nchrome_step('Input.dispatchKeyEvent',{type: 'char', text: value[character]});}};", "chrome_step('Input.insertText',{text: value});};"), tagui_header_js)
-        dump(load(tagui_sikuli_py).replace('scan_period = 0.5', 'scan_period = 0.05\n\n# teleport mouse instead of moving to target\nSettings.MoveMouseDelay = 0'), tagui_sikuli_py)
+    if not _tagui_patch(tagui_directory, turbo_mode): return _tagui_cleanup(tagui_session)
+    phase_start = _tagui_phase('init', 'patch', phase_start)
 
     # entry shell command to invoke tagui process
     tagui_cmd = '"' + tagui_executable + '"' + ' rpa_python ' + browser_option
 
     # run tagui end processes script to flush dead processes
     # for eg execution ended with ctrl+c or forget to close()
-    os.system('"' + end_processes_executable + '"')
+    # only needed if marker file is left behind by such unclean exit,
+    # and skipped when other sessions are running, as it ends them too
+    with _tagui_sessions_lock:
+        # tagui launches chrome on port 9222 with tagui_user_profile, ending chrome already on that port,
+        # so only one session at a time can use chrome, other sessions can run without chrome_browser
+        chrome_sessions = [other_session for other_session in _tagui_sessions if other_session._tagui_browser]
+        if browser_option != '' and len(chrome_sessions) > 0:
+            chrome_error = True
+        else:
+            chrome_error = False
+            tagui_session._tagui_browser = (browser_option != '')
+            if len(_tagui_sessions) == 0:
+                if os.path.isfile(_tagui_marker()):
+                    os.system('"' + end_processes_executable + '"')
+                try:
+                    dump(str(os.getpid()), _tagui_marker())
+                except Exception as e:
+                    pass
+            _tagui_sessions.append(tagui_session)
+
+    if chrome_error:
+        _tagui_cleanup(tagui_session)
+        show_error('[RPA][ERROR] - Chrome is used by another session, other sessions can use init(chrome_browser = False)')
+        return False
+    phase_start = _tagui_phase('init', 'end_processes', phase_start)
 
     try:
         # launch tagui using subprocess
-        _process = subprocess.Popen(
+        tagui_session._process = subprocess.Popen(
             tagui_cmd, shell=True,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            cwd=tagui_session._tagui_directory or None
         )
 
+        # start reader thread so waiting for output blocks instead of spinning
+        tagui_session._tagui_output_queue = queue.Queue()
+        tagui_reader = threading.Thread(target = _tagui_reader, args = (tagui_session._process, tagui_session._tagui_output_queue))
+        tagui_reader.daemon = True; tagui_reader.start()
+        wait_deadline = _tagui_deadline_time()
+        phase_start = _tagui_phase('init', 'popen', phase_start)
+
         # loop until tagui live mode is ready or tagui process has ended
         while True:
 
             # failsafe exit if tagui process gets killed for whatever reason
-            if _process.poll() is not None:
+            if tagui_session._process.poll() is not None:
                 print('[RPA][ERROR] - following happens when starting TagUI...')
                 print('')
                 print('The following command is executed to start TagUI -')
                 print(tagui_cmd)
                 print('')
                 print('It leads to following output when starting TagUI -')
-                os.system(tagui_cmd)
+                subprocess.call(tagui_cmd, shell=True, cwd=tagui_session._tagui_directory or None)
                 print('')
-                _tagui_visual = False
-                _tagui_chrome = False
-                _tagui_started = False
+                _tagui_cleanup(tagui_session)
                 show_error()
                 return False
 
             # read next line of output from tagui process live mode interface
-            tagui_out = _tagui_read()
+            tagui_out = _tagui_read(wait_deadline)
+
+            # failsafe exit if tagui process does not start before deadline
+            if tagui_out is None:
+                tagui_session._process.kill(); _tagui_cleanup(tagui_session)
+                show_error('[RPA][ERROR] - TagUI did not start within ' + str(_session()._tagui_deadline) + ' seconds')
+                return False
+
+            # wait for tagui process to end before checking again above
+            if tagui_out == '':
+                tagui_session._process.wait(); continue
 
             # check that tagui live mode is ready then start listening for inputs
             if 'LIVE MODE - type done to quit' in tagui_out:
+                phase_start = _tagui_phase('init', 'live_mode', phase_start)
+
                 # dummy + start line to clear live mode backspace char before listening
                 _tagui_write('echo "[RPA][STARTED]"\n')
-                _tagui_write('echo "[RPA][' + str(_tagui_id) + '] - listening for inputs"\n')
-                _tagui_visual = visual_automation
-                _tagui_chrome = chrome_browser
-                _tagui_started = True
+                _tagui_write('echo "[RPA][' + str(tagui_session._tagui_id) + '] - listening for inputs"\n')
+                tagui_session._tagui_visual = visual_automation
+                tagui_session._tagui_chrome = chrome_browser
+                tagui_session._tagui_started = True
 
                 # loop until tagui live mode is ready and listening for inputs
                 # also check _tagui_started to handle unexpected termination
-                while _tagui_started and not _ready(): pass
-                if not _tagui_started:
+                while tagui_session._tagui_started and not _ready(wait_deadline):
+                    if wait_deadline is not None and time.time() > wait_deadline: break
+                if not tagui_session._tagui_started:
+                    _tagui_cleanup(tagui_session)
                     show_error('[RPA][ERROR] - TagUI process ended unexpectedly')
                     return False
+                if wait_deadline is not None and time.time() > wait_deadline:
+                    tagui_session._process.kill(); _tagui_cleanup(tagui_session)
+                    show_error('[RPA][ERROR] - TagUI did not start within ' + str(_session()._tagui_deadline) + ' seconds')
+                    return False
 
                 # remove generated tagui flow, js code and custom functions files
-                if os.path.isfile('rpa_python'): os.remove('rpa_python')
-                if os.path.isfile('rpa_python.js'): os.remove('rpa_python.js')
-                if os.path.isfile('rpa_python.raw'): os.remove('rpa_python.raw')
-                if os.path.isfile('tagui_local.js'): os.remove('tagui_local.js')
+                for generated_file in ['rpa_python', 'rpa_python.js', 'rpa_python.raw', 'tagui_local.js']:
+                    generated_file = os.path.join(tagui_session._tagui_directory, generated_file)
+                    if os.path.isfile(generated_file): os.remove(generated_file)
 
                 # increment id and prepare for next instruction
-                _tagui_id = _tagui_id + 1
+                tagui_session._tagui_id = tagui_session._tagui_id + 1
 
                 # set variable to track original directory when init() was called
-                _tagui_init_directory = os.getcwd()
+                tagui_session._tagui_init_directory = os.path.abspath(tagui_session._tagui_directory or os.getcwd())
 
                 # set variable to track file download directory for web browser 
-                _tagui_download_directory = os.getcwd()
+                tagui_session._tagui_download_directory = os.getcwd()
 
+                _tagui_phase('init', 'ready', phase_start)
+                _tagui_phases_dump('init', init_start)
                 return True
 
     except Exception as e:
-        _tagui_visual = False
-        _tagui_chrome = False
-        _tagui_started = False
+        _tagui_cleanup(tagui_session)
         show_error('[RPA][ERROR] - ' + str(e))
         return False
 
@@ -648,8 +2086,8 @@ def pack():
     print('[RPA][INFO] - detecting and zipping your TagUI installation to rpa_python.zip ...')
 
     # first make sure TagUI files have been downloaded and synced to latest stable delta files
-    global _tagui_started
-    if _tagui_started:
+    tagui_session = _session()
+    if tagui_session._tagui_started:
         if not close():
             return False
     if not init(False, False):
@@ -781,36 +2219,49 @@ print('[RPA][INFO] - done. RPA for Python updated to version ' + __version__)
         show_error('[RPA][ERROR] - ' + str(e))
         return False
 
-def _ready():
+def _ready(wait_deadline = None):
     """internal function to check if tagui is ready to receive instructions after init() is called"""
 
-    global _process, _tagui_started, _tagui_id, _tagui_visual, _tagui_chrome
+    tagui_session = _session()
 
-    if not _tagui_started:
+    if not tagui_session._tagui_started:
         # print output error in calling parent function instead
         return False
 
     try:
         # failsafe exit if tagui process gets killed for whatever reason
-        if _process.poll() is not None:
+        if tagui_session._process.poll() is not None:
             # print output error in calling parent function instead
-            _tagui_visual = False
-            _tagui_chrome = False
-            _tagui_started = False
+            _tagui_ended(tagui_session)
             return False
 
         # read next line of output from tagui process live mode interface
-        tagui_out = _tagui_read()
+        tagui_out = _tagui_read(wait_deadline)
+        if tagui_out is None: return False
+
+        # failsafe exit if output ends because tagui process has ended
+        if tagui_out == '':
+            tagui_session._process.wait()
+            _tagui_ended(tagui_session)
+            return False
 
         # print to screen debug output that is saved to rpa_python.log
         if debug():
             sys.stdout.write(tagui_out); sys.stdout.flush()
 
         # check if tagui live mode is listening for inputs and return result
-        if tagui_out.strip().startswith('[RPA][') and tagui_out.strip().endswith('] - listening for inputs'):
-            return True
-        else:
-            return False
+        # id is checked to skip late marker of instruction past its deadline
+        tagui_out = tagui_out.strip()
+        if tagui_out.startswith('[RPA][') and tagui_out.endswith('] - listening for inputs'):
+            return tagui_out == '[RPA][' + str(tagui_session._tagui_id) + '] - listening for inputs'
+
+        # keep in-band result framed with instruction id, eg [RPA][8] = "result"
+        if tagui_out.startswith('[RPA]['):
+            result_id = tagui_out[6:tagui_out.find(']', 6)]
+            if result_id.isdigit() and tagui_out[6 + len(result_id):].startswith('] = '):
+                tagui_session._tagui_results[int(result_id)] = tagui_out[6 + len(result_id) + 4:]
+
+        return False
 
     except Exception as e:
         show_error('[RPA][ERROR] - ' + str(e))
@@ -819,59 +2270,104 @@ def _ready():
 def send(tagui_instruction = None):
     """send next live mode instruction to tagui for processing if tagui is ready"""
 
-    global _process, _tagui_started, _tagui_id, _tagui_visual, _tagui_chrome
+    tagui_session = _session()
 
-    if not _tagui_started:
+    if not tagui_session._tagui_started:
         show_error('[RPA][ERROR] - use init() before using send()')
         return False
 
     if tagui_instruction is None or tagui_instruction == '': return True
 
-    try:
-        # failsafe exit if tagui process gets killed for whatever reason
-        if _process.poll() is not None:
-            _tagui_visual = False
-            _tagui_chrome = False
-            _tagui_started = False
-            show_error('[RPA][ERROR] - no active TagUI process to send()')
-            return False
+    # queue instruction to be sent in one round-trip when batch() ends
+    if tagui_session._tagui_batch is not None:
+        tagui_session._tagui_batch.append(tagui_instruction); return True
 
-        # escape special characters for them to reach tagui correctly
-        tagui_instruction = tagui_instruction.replace('\\','\\\\')
-        tagui_instruction = tagui_instruction.replace('\n','\\n')
-        tagui_instruction = tagui_instruction.replace('\r','\\r')
-        tagui_instruction = tagui_instruction.replace('\t','\\t')
-        tagui_instruction = tagui_instruction.replace('\a','\\a')
-        tagui_instruction = tagui_instruction.replace('\b','\\b')
-        tagui_instruction = tagui_instruction.replace('\f','\\f')
+    return send_many([tagui_instruction])
 
-        # special handling for single quote to work with _esq() for tagui
-        tagui_instruction = tagui_instruction.replace('[BACKSLASH_QUOTE]','\\\'')
+def send_many(tagui_instructions = None):
+    """send list of live mode instructions to tagui in one round-trip and wait for all"""
 
-        # escape backslash to display source string correctly after echoing
-        echo_safe_instruction = tagui_instruction.replace('\\','\\\\')
+    tagui_session = _session()
 
-        # escape double quote because echo step below uses double quotes 
-        echo_safe_instruction = echo_safe_instruction.replace('"','\\"')
+    if not tagui_session._tagui_started:
+        show_error('[RPA][ERROR] - use init() before using send_many()')
+        return False
 
-        # echo live mode instruction, after preparing string to be echo-safe
-        _tagui_write('echo "[RPA][' + str(_tagui_id) + '] - ' + echo_safe_instruction + '"\n')
+    if tagui_instructions is None: return True
+    tagui_instructions = [instruction for instruction in tagui_instructions if instruction is not None and instruction != '']
+    if len(tagui_instructions) == 0: return True
 
-        # send live mode instruction to be executed
-        _tagui_write(tagui_instruction + '\n')
+    try:
+        # failsafe exit if tagui process gets killed for whatever reason
+        if tagui_session._process.poll() is not None:
+            _tagui_ended(tagui_session)
+            show_error('[RPA][ERROR] - no active TagUI process to send()')
+            return False
 
-        # echo marker text to prepare for next instruction
-        _tagui_write('echo "[RPA][' + str(_tagui_id) + '] - listening for inputs"\n')
+        live_mode_input = ''
+        for instruction_index, tagui_instruction in enumerate(tagui_instructions):
+            # escape special characters for them to reach tagui correctly
+            tagui_instruction = tagui_instruction.replace('\\','\\\\')
+            tagui_instruction = tagui_instruction.replace('\n','\\n')
+            tagui_instruction = tagui_instruction.replace('\r','\\r')
+            tagui_instruction = tagui_instruction.replace('\t','\\t')
+            tagui_instruction = tagui_instruction.replace('\a','\\a')
+            tagui_instruction = tagui_instruction.replace('\b','\\b')
+            tagui_instruction = tagui_instruction.replace('\f','\\f')
+
+            # special handling for single quote to work with _esq() for tagui
+            tagui_instruction = tagui_instruction.replace('[BACKSLASH_QUOTE]','\\\'')
+
+            # escape backslash to display source string correctly after echoing
+            echo_safe_instruction = tagui_instruction.replace('\\','\\\\')
+
+            # escape double quote because echo step below uses double quotes 
+            echo_safe_instruction = echo_safe_instruction.replace('"','\\"')
+
+            # echo live mode instruction, after preparing string to be echo-safe
+            instruction_id = str(tagui_session._tagui_id + instruction_index)
+            live_mode_input += 'echo "[RPA][' + instruction_id + '] - ' + echo_safe_instruction + '"\n'
+
+            # send live mode instruction to be executed
+            live_mode_input += tagui_instruction + '\n'
+
+            # echo marker text to prepare for next instruction
+            live_mode_input += 'echo "[RPA][' + instruction_id + '] - listening for inputs"\n'
+
+        # write all instructions in one flush so pipe latency is paid once
+        _tagui_write(live_mode_input)
+        wait_deadline = _tagui_deadline_time()
+
+        for instruction_index, tagui_instruction in enumerate(tagui_instructions):
+            wait_start_time = time.time(); wait_start_cpu = _cpu_time()
+
+            # loop until tagui live mode is ready and listening for inputs
+            # also check _tagui_started to handle unexpected termination
+            while tagui_session._tagui_started and not _ready(wait_deadline):
+                if wait_deadline is not None and time.time() > wait_deadline:
+                    # skip ids of instructions not acknowledged, for next instruction
+                    tagui_session._tagui_id = tagui_session._tagui_id + len(tagui_instructions) - instruction_index
+                    show_error('[RPA][ERROR] - TagUI did not respond within ' + str(_session()._tagui_deadline) + \
+                                ' seconds to instruction - ' + tagui_instruction)
+                    return False
 
-        # loop until tagui live mode is ready and listening for inputs
-        # also check _tagui_started to handle unexpected termination
-        while _tagui_started and not _ready(): pass
-        if not _tagui_started:
-            show_error('[RPA][ERROR] - TagUI process ended unexpectedly')
-            return False
+            if not tagui_session._tagui_started:
+                if len(tagui_instructions) == 1:
+                    show_error('[RPA][ERROR] - TagUI process ended unexpectedly')
+                else:
+                    show_error('[RPA][ERROR] - TagUI process ended unexpectedly at instruction ' + \
+                                str(instruction_index + 1) + ' of ' + str(len(tagui_instructions)) + \
+                                ' - ' + tagui_instruction)
+                return False
 
-        # increment id and prepare for next instruction
-        _tagui_id = _tagui_id + 1
+            # record wall and cpu time spent waiting when measure() is on
+            if tagui_session._tagui_measure is not None:
+                tagui_session._tagui_measure.append({'instruction': tagui_instruction,
+                                       'wait_time': time.time() - wait_start_time,
+                                       'cpu_time': _cpu_time() - wait_start_cpu})
+
+            # increment id and prepare for next instruction
+            tagui_session._tagui_id = tagui_session._tagui_id + 1
 
         return True
 
@@ -879,71 +2375,223 @@ def send(tagui_instruction = None):
         show_error('[RPA][ERROR] - ' + str(e))
         return False
 
+def batch():
+    """context manager to queue send() instructions and send them in one round-trip"""
+    # steps that need a result, eg read(), exist(), click() on web element, send queue first,
+    # result of context object is False if any send fails, eg with r.batch() as b, b.result
+    # session is resolved now, as with block may run after switching session
+    return _batch(_session())
+
+class _BatchResult(object):
+    """context object of batch(), result is False if sending queued instructions fails"""
+
+    def __init__(self):
+        self.result = True
+
+@contextlib.contextmanager
+def _batch(tagui_session = None):
+    """context manager for batch() on given tagui session"""
+
+    # nested batch() joins the outer batch which sends on its exit
+    if tagui_session._tagui_batch is not None:
+        yield tagui_session._tagui_batch_result; return
+
+    tagui_session._tagui_batch = []
+    tagui_session._tagui_batch_result = _BatchResult()
+    try:
+        yield tagui_session._tagui_batch_result
+    except:
+        tagui_session._tagui_batch = None; raise
+
+    batch_instructions = tagui_session._tagui_batch; tagui_session._tagui_batch = None
+    with tagui_session:
+        if not send_many(batch_instructions): tagui_session._tagui_batch_result.result = False
+
+def _batch_flush():
+    """function to send queued batch() instructions before a result is needed"""
+    tagui_session = _session()
+    if not tagui_session._tagui_batch: return True
+    batch_instructions = tagui_session._tagui_batch; tagui_session._tagui_batch = []
+    if send_many(batch_instructions): return True
+    tagui_session._tagui_batch_result.result = False
+    return False
+
 def close():
     """disconnect from tagui process by sending 'done' trigger instruction"""
 
-    global _process, _tagui_started, _tagui_id, _tagui_visual, _tagui_chrome, _tagui_init_directory
+    tagui_session = _session()
 
-    if not _tagui_started:
+    if not tagui_session._tagui_started:
         show_error('[RPA][ERROR] - use init() before using close()')
         return False
 
+    # reset timing of close() phases, each phase ends with _tagui_phase()
+    tagui_session._tagui_phases['close'] = []
+    close_start = phase_start = time.time()
+
     try:
         # failsafe exit if tagui process gets killed for whatever reason
-        if _process.poll() is not None:
-            _tagui_visual = False
-            _tagui_chrome = False
-            _tagui_started = False
+        if tagui_session._process.poll() is not None:
+            _tagui_ended(tagui_session)
             show_error('[RPA][ERROR] - no active TagUI process to close()')
             return False
 
+        # detach from serve() daemon instead of ending its tagui process
+        if isinstance(tagui_session._process, _TaguiConnection):
+            if not _tagui_detach(): return False
+            _tagui_phase('close', 'detach', phase_start)
+            _tagui_phases_dump('close', close_start); return True
+
         # send 'done' instruction to terminate live mode and exit tagui
         _tagui_write('echo "[RPA][FINISHED]"\n')
         _tagui_write('done\n')
 
-        # loop until tagui process has closed before returning control
-        while _process.poll() is None: pass
+        # block until tagui process has closed before returning control
+        wait_deadline = _tagui_deadline_time()
+        if wait_deadline is None:
+            tagui_session._process.wait()
+        else:
+            while tagui_session._process.poll() is None:
+                if time.time() > wait_deadline:
+                    tagui_session._process.kill(); tagui_session._process.wait()
+                    print('[RPA][INFO] - TagUI did not close within ' + str(_session()._tagui_deadline) + ' seconds, ended it')
+                    break
+                time.sleep(_tagui_delay)
+        phase_start = _tagui_phase('close', 'done', phase_start)
+
+        # remove marker file when last running tagui process has ended cleanly
+        with _tagui_sessions_lock:
+            if _tagui_sessions == [tagui_session] and os.path.isfile(_tagui_marker()):
+                os.remove(_tagui_marker())
 
         # remove again generated tagui flow, js code and custom functions files
-        if os.path.isfile('rpa_python'): os.remove('rpa_python')
-        if os.path.isfile('rpa_python.js'): os.remove('rpa_python.js')
-        if os.path.isfile('rpa_python.raw'): os.remove('rpa_python.raw')
-        if os.path.isfile('tagui_local.js'): os.remove('tagui_local.js')
+        # files in current directory belong to session running tagui there
+        if tagui_session._tagui_directory == '':
+            if os.path.isfile('rpa_python'): os.remove('rpa_python')
+            if os.path.isfile('rpa_python.js'): os.remove('rpa_python.js')
+            if os.path.isfile('rpa_python.raw'): os.remove('rpa_python.raw')
+            if os.path.isfile('tagui_local.js'): os.remove('tagui_local.js')
 
         # to handle user changing current directory after init() is called
-        if os.path.isfile(os.path.join(_tagui_init_directory, 'rpa_python')):
-            os.remove(os.path.join(_tagui_init_directory, 'rpa_python'))
-        if os.path.isfile(os.path.join(_tagui_init_directory, 'rpa_python.js')):
-            os.remove(os.path.join(_tagui_init_directory, 'rpa_python.js'))
-        if os.path.isfile(os.path.join(_tagui_init_directory, 'rpa_python.raw')):
-            os.remove(os.path.join(_tagui_init_directory, 'rpa_python.raw'))
-        if os.path.isfile(os.path.join(_tagui_init_directory, 'tagui_local.js')):
-            os.remove(os.path.join(_tagui_init_directory, 'tagui_local.js'))   
+        if os.path.isfile(os.path.join(tagui_session._tagui_init_directory, 'rpa_python')):
+            os.remove(os.path.join(tagui_session._tagui_init_directory, 'rpa_python'))
+        if os.path.isfile(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.js')):
+            os.remove(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.js'))
+        if os.path.isfile(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.raw')):
+            os.remove(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.raw'))
+        if os.path.isfile(os.path.join(tagui_session._tagui_init_directory, 'tagui_local.js')):
+            os.remove(os.path.join(tagui_session._tagui_init_directory, 'tagui_local.js'))   
 
         # remove generated tagui log and data files if not in debug mode
         if not debug():
-            if os.path.isfile('rpa_python.log'): os.remove('rpa_python.log')
-            if os.path.isfile('rpa_python.txt'): os.remove('rpa_python.txt')
+            if tagui_session._tagui_directory == '':
+                if os.path.isfile('rpa_python.log'): os.remove('rpa_python.log')
+                if os.path.isfile('rpa_python.txt'): os.remove('rpa_python.txt')
         
             # to handle user changing current directory after init() is called
-            if os.path.isfile(os.path.join(_tagui_init_directory, 'rpa_python.log')):
-                os.remove(os.path.join(_tagui_init_directory, 'rpa_python.log'))
-            if os.path.isfile(os.path.join(_tagui_init_directory, 'rpa_python.txt')):
-                os.remove(os.path.join(_tagui_init_directory, 'rpa_python.txt'))
-
-        _tagui_visual = False
-        _tagui_chrome = False
-        _tagui_started = False
+            if os.path.isfile(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.log')):
+                os.remove(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.log'))
+            if os.path.isfile(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.txt')):
+                os.remove(os.path.join(tagui_session._tagui_init_directory, 'rpa_python.txt'))
+
+            # remove private temp directory created by init() for the session
+            if tagui_session._working_directory is None and os.path.isdir(tagui_session._tagui_directory):
+                shutil.rmtree(tagui_session._tagui_directory, True)
+
+        _tagui_ended(tagui_session)
+        _tagui_phase('close', 'cleanup', phase_start)
+        _tagui_phases_dump('close', close_start)
         return True
 
-    except Exception as e:
-        _tagui_visual = False
-        _tagui_chrome = False
-        _tagui_started = False
-        show_error('[RPA][ERROR] - ' + str(e))
-        return False
+    except Exception as e:
+        _tagui_ended(tagui_session)
+        show_error('[RPA][ERROR] - ' + str(e))
+        return False
+
+def xpath(xpath_selector = ''):
+    """function to return identifier that tagui matches only as xpath"""
+    if xpath_selector.startswith('/') or xpath_selector.startswith('('): return xpath_selector
+    else: return '(' + xpath_selector + ')'
+
+def css(css_selector = ''):
+    """function to return identifier for css selector, as xpath if it is a simple selector"""
+    # eg 'div.item > a[href]' to '//div[contains(concat(" ",normalize-space(@class)," ")," item ")]/a[@href]'
+    css_compound = re.compile(r'^([a-zA-Z][\w-]*|\*)?((?:#[\w-]+|\.[\w-]+|\[[\w-]+(?:=(?:"[^"]*"|\'[^\']*\'|[\w-]+))?\])*)$')
+    css_part = re.compile(r'#[\w-]+|\.[\w-]+|\[[\w-]+(?:=(?:"[^"]*"|\'[^\']*\'|[\w-]+))?\]')
+    xpath_selector = ''; css_combinator = '//'
+
+    for css_token in re.sub(r'\s*>\s*', ' > ', css_selector.strip()).split():
+        if css_token == '>':
+            if css_combinator != '//' or xpath_selector == '': return css_selector
+            css_combinator = '/'; continue
+
+        # other selectors, eg :nth-child() or ~, are left for tagui to match as css
+        css_match = css_compound.match(css_token)
+        if css_match is None: return css_selector
+        xpath_step = css_match.group(1) or '*'
+        for css_predicate in css_part.findall(css_match.group(2)):
+            if css_predicate.startswith('#'): xpath_step += '[@id="' + css_predicate[1:] + '"]'
+            elif css_predicate.startswith('.'):
+                xpath_step += '[contains(concat(" ",normalize-space(@class)," ")," ' + css_predicate[1:] + ' ")]'
+            elif '=' in css_predicate:
+                attribute_name, attribute_value = css_predicate[1:-1].split('=', 1)
+                if attribute_value[0] in '"\'': attribute_value = attribute_value[1:-1]
+                if '"' in attribute_value or "'" in attribute_value: return css_selector
+                xpath_step += '[@' + attribute_name + '="' + attribute_value + '"]'
+            else: xpath_step += '[@' + css_predicate[1:-1] + ']'
+        xpath_selector += css_combinator + xpath_step; css_combinator = '//'
+
+    if xpath_selector == '' or css_combinator != '//': return css_selector
+    return xpath_selector
+
+def by_id(id_value = ''):
+    """function to return xpath identifier of element with id attribute equal to id_value"""
+    return '//*[@id="' + id_value + '"]'
+
+def by_text(text_value = ''):
+    """function to return xpath identifier of element with text containing text_value, like tagui"""
+    return '//*[contains(text(),"' + text_value + '")]'
+
+class _Element(str):
+    """element handle from find(), an xpath to the element marked in webpage, usable as identifier"""
+
+    def __new__(cls, handle_xpath = '', element_identifier = ''):
+        element_handle = str.__new__(cls, handle_xpath)
+        element_handle.identifier = element_identifier
+        return element_handle
+
+def find(element_identifier = None):
+    """function to find element once and return handle for later steps to skip finding it again"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using find()')
+        return None
+
+    if element_identifier is None or element_identifier == '':
+        show_error('[RPA][ERROR] - target missing for find()')
+        return None
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - find() requires init(chrome_browser = True)')
+        return None
+
+    if element_identifier.lower().endswith('.png') or element_identifier.lower().endswith('.bmp') or \
+       (element_identifier.startswith('(') and element_identifier.endswith(')') and not any(c.isalpha() for c in element_identifier)):
+        show_error('[RPA][ERROR] - find() is for web elements, not ' + element_identifier)
+        return None
+
+    # element is marked with handle attribute, which is marked again if element is replaced
+    handle_output = _tagui_eval('JSON.stringify(rpa_find_handle(\'' + _sdq(element_identifier) + '\'))')
+    try:
+        handle_xpath = json.loads(handle_output)
+    except ValueError:
+        handle_xpath = None
+    if handle_xpath is None:
+        show_error('[RPA][ERROR] - cannot find ' + element_identifier)
+        return None
 
-def exist(element_identifier = None):
+    return _Element(handle_xpath, element_identifier)
+
+def exist(element_identifier = None, poll_interval = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using exist()')
         return False
@@ -975,14 +2623,38 @@ def exist(element_identifier = None):
                     show_error('[RPA][ERROR] - x, y coordinates require init(visual_automation = True)')
                     return False
 
-    send('exist_result = exist(\'' + _sdq(element_identifier) + '\').toString()')
-    send('dump exist_result to rpa_python.txt')
-    if _tagui_output() == 'true':
+    # interval in seconds to check again for visual automation element
+    if poll_interval is None: poll_milliseconds = 'null'
+    else: poll_milliseconds = str(int(float(poll_interval) * 1000))
+
+    # wait for timeout_in_seconds if given, else timeout() or adaptive wait for identifier
+    wait_milliseconds = _wait_time(element_identifier, timeout_in_seconds); exist_start = time.time()
+
+    # keep strategy found for web identifier, so next steps use it instead of trying each
+    tagui_session = _session()
+    if tagui_session._tagui_inband and _chrome() and _strategy_cacheable(element_identifier):
+        strategy_output = _tagui_eval('JSON.stringify(rpa_strategy(\'' + _sdq(element_identifier) + '\', ' +
+                                      json.dumps(tagui_session._tagui_strategies.get(element_identifier)) + ', ' +
+                                      poll_milliseconds + ', ' + wait_milliseconds + '))')
+        try:
+            strategy_found = json.loads(strategy_output)
+        except ValueError:
+            strategy_found = None
+        if strategy_found is None:
+            tagui_session._tagui_strategies.pop(element_identifier, None)
+            return False
+        tagui_session._tagui_strategies[element_identifier] = strategy_found
+        _wait_record(element_identifier, time.time() - exist_start)
+        return True
+
+    # check and return result in-band in one round-trip instead of setting variable first
+    if _tagui_eval('exist(\'' + _sdq(_visual_file(element_identifier)) + '\', ' + poll_milliseconds + ', ' + wait_milliseconds + ').toString()') == 'true':
+        _wait_record(element_identifier, time.time() - exist_start)
         return True
     else:
         return False
 
-def url(webpage_url = None):
+def url(webpage_url = None, wait_until = None, idle_ms = 500):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using url()')
         return False
@@ -991,10 +2663,18 @@ def url(webpage_url = None):
         show_error('[RPA][ERROR] - url() requires init(chrome_browser = True)')
         return False
 
+    if wait_until is not None and wait_until not in ['domcontentloaded', 'load', 'networkidle']:
+        show_error('[RPA][ERROR] - wait_until for url() must be domcontentloaded, load or networkidle')
+        return False
+
     if webpage_url is not None and webpage_url != '':
         if webpage_url.lower().startswith('www.'): webpage_url = 'https://' + webpage_url 
         if webpage_url.startswith('http://') or webpage_url.startswith('https://'):
-            if not send(_esq(webpage_url)):
+            # strategies found are for current webpage, also checked against url by rpa_strategy()
+            _session()._tagui_strategies.clear()
+            if wait_until is not None:
+                return _wait_until(wait_until, idle_ms, None, webpage_url)
+            elif not send(_esq(webpage_url)):
                 return False
             else:
                 return True
@@ -1003,11 +2683,47 @@ def url(webpage_url = None):
             return False
 
     else:
-        send('dump url() to rpa_python.txt')
-        url_result = _tagui_output()
+        url_result = _tagui_fetch('url()')
         return url_result
 
-def click(element_identifier = None, test_coordinate = None):
+def _wait_until(wait_until = 'load', idle_ms = 500, timeout_in_seconds = None, webpage_url = None):
+    """function to wait until webpage reaches load state, after going to url if given"""
+    tagui_session = _session()
+    if timeout_in_seconds is None: timeout_in_seconds = tagui_session._tagui_timeout
+    wait_expression = 'rpa_wait_until(' + json.dumps(wait_until) + ', ' + str(int(idle_ms)) + ', ' + \
+                      str(int(float(timeout_in_seconds) * 1000)) + ', ' + json.dumps(webpage_url) + ')'
+
+    # mark current webpage, go to url and wait for new webpage in one round-trip where possible
+    wait_instructions = []
+    if webpage_url is not None: wait_instructions = ['js rpa_navigate_mark()', _esq(webpage_url)]
+    if not _batch_flush(): return False
+    if tagui_session._tagui_inband:
+        result_id = tagui_session._tagui_id + len(wait_instructions)
+        if not send_many(wait_instructions + ['js rpa_result(' + str(result_id) + ', ' + wait_expression + ')']): return False
+        wait_result = json.loads(tagui_session._tagui_results.pop(result_id, 'false'))
+    else:
+        if not send_many(wait_instructions): return False
+        wait_result = _tagui_eval(wait_expression) == 'true'
+
+    if wait_result is True:
+        return True
+    else:
+        show_error('[RPA][ERROR] - webpage not ' + wait_until + ' before timeout')
+        return False
+
+def wait_for_network_idle(idle_ms = 500, timeout_in_seconds = None):
+    """function to wait until no request finishes on webpage for idle_ms after it loads"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using wait_for_network_idle()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - wait_for_network_idle() requires init(chrome_browser = True)')
+        return False
+
+    return _wait_until('networkidle', idle_ms, timeout_in_seconds)
+
+def click(element_identifier = None, test_coordinate = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using click()')
         return False
@@ -1019,17 +2735,21 @@ def click(element_identifier = None, test_coordinate = None):
     if test_coordinate is not None and isinstance(test_coordinate, int):
         element_identifier = coord(element_identifier, test_coordinate)
 
-    if not exist(element_identifier):
+    # wait for element and act on it in one round-trip where possible
+    fused_result = _tagui_fused('click', element_identifier, timeout_in_seconds)
+    if fused_result is not None: return fused_result
+
+    if not exist(element_identifier, None, timeout_in_seconds):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('click ' + _sdq(element_identifier)):
+    elif not send('click ' + _sdq(_strategy(element_identifier))):
         return False
 
     else:
         return True
 
-def rclick(element_identifier = None, test_coordinate = None):
+def rclick(element_identifier = None, test_coordinate = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using rclick()')
         return False
@@ -1041,17 +2761,21 @@ def rclick(element_identifier = None, test_coordinate = None):
     if test_coordinate is not None and isinstance(test_coordinate, int):
         element_identifier = coord(element_identifier, test_coordinate)
 
-    if not exist(element_identifier):
+    # wait for element and act on it in one round-trip where possible
+    fused_result = _tagui_fused('rclick', element_identifier, timeout_in_seconds)
+    if fused_result is not None: return fused_result
+
+    if not exist(element_identifier, None, timeout_in_seconds):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('rclick ' + _sdq(element_identifier)):
+    elif not send('rclick ' + _sdq(_strategy(element_identifier))):
         return False
 
     else:
         return True
 
-def dclick(element_identifier = None, test_coordinate = None):
+def dclick(element_identifier = None, test_coordinate = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using dclick()')
         return False
@@ -1063,17 +2787,21 @@ def dclick(element_identifier = None, test_coordinate = None):
     if test_coordinate is not None and isinstance(test_coordinate, int):
         element_identifier = coord(element_identifier, test_coordinate)
 
-    if not exist(element_identifier):
+    # wait for element and act on it in one round-trip where possible
+    fused_result = _tagui_fused('dclick', element_identifier, timeout_in_seconds)
+    if fused_result is not None: return fused_result
+
+    if not exist(element_identifier, None, timeout_in_seconds):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('dclick ' + _sdq(element_identifier)):
+    elif not send('dclick ' + _sdq(_strategy(element_identifier))):
         return False
 
     else:
         return True
 
-def hover(element_identifier = None, test_coordinate = None):
+def hover(element_identifier = None, test_coordinate = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using hover()')
         return False
@@ -1085,17 +2813,21 @@ def hover(element_identifier = None, test_coordinate = None):
     if test_coordinate is not None and isinstance(test_coordinate, int):
         element_identifier = coord(element_identifier, test_coordinate)
 
-    if not exist(element_identifier):
+    # wait for element and act on it in one round-trip where possible
+    fused_result = _tagui_fused('hover', element_identifier, timeout_in_seconds)
+    if fused_result is not None: return fused_result
+
+    if not exist(element_identifier, None, timeout_in_seconds):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('hover ' + _sdq(element_identifier)):
+    elif not send('hover ' + _sdq(_strategy(element_identifier))):
         return False
 
     else:
         return True
 
-def type(element_identifier = None, text_to_type = None, test_coordinate = None):
+def type(element_identifier = None, text_to_type = None, test_coordinate = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using type()')
         return False
@@ -1112,11 +2844,11 @@ def type(element_identifier = None, text_to_type = None, test_coordinate = None)
         element_identifier = coord(element_identifier, text_to_type)
         text_to_type = test_coordinate
 
-    if not exist(element_identifier):
+    if not exist(element_identifier, None, timeout_in_seconds):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('type ' + _sdq(element_identifier) + ' as ' + _esq(text_to_type)):
+    elif not send('type ' + _sdq(_strategy(element_identifier)) + ' as ' + _esq(text_to_type)):
         return False
 
     else:
@@ -1159,13 +2891,13 @@ def select(element_identifier = None, option_value = None, test_coordinate1 = No
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('select ' + _sdq(element_identifier) + ' as ' + _esq(option_value)):
+    elif not send('select ' + _sdq(_strategy(element_identifier)) + ' as ' + _esq(_visual_file(option_value))):
         return False
 
     else:
         return True
 
-def read(element_identifier = None, test_coordinate1 = None, test_coordinate2 = None, test_coordinate3 = None):
+def read(element_identifier = None, test_coordinate1 = None, test_coordinate2 = None, test_coordinate3 = None, timeout_in_seconds = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using read()')
         return ''
@@ -1180,16 +2912,57 @@ def read(element_identifier = None, test_coordinate1 = None, test_coordinate2 =
                 element_identifier = coord(element_identifier, test_coordinate1) + '-'
                 element_identifier = element_identifier + coord(test_coordinate2, test_coordinate3)
 
-    if element_identifier.lower() != 'page' and not exist(element_identifier):
+    # web element is waited for and read in one round-trip where possible
+    fused_result = _tagui_fused('read', element_identifier, timeout_in_seconds)
+    if fused_result is False: return ''
+    elif fused_result is not None: return fused_result
+
+    if element_identifier.lower() != 'page' and not exist(element_identifier, None, timeout_in_seconds):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return ''
 
     else:
-        send('read ' + _sdq(element_identifier) + ' to read_result')
-        send('dump read_result to rpa_python.txt')
-        read_result = _tagui_output()
+        send('read ' + _sdq(_strategy(element_identifier)) + ' to read_result')
+        read_result = _tagui_fetch('read_result')
         return read_result
 
+def read_many(element_identifiers = None):
+    """function to read dict or list of elements in one round-trip, None for element not found"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using read_many()')
+        return None
+
+    if element_identifiers is None or len(element_identifiers) == 0:
+        show_error('[RPA][ERROR] - targets missing for read_many()')
+        return None
+
+    if isinstance(element_identifiers, dict): read_keys = list(element_identifiers.keys())
+    else: read_keys = list(range(len(element_identifiers)))
+
+    # visual automation elements are read by sikulix one by one using read()
+    read_results = {}; read_identifiers = []
+    for read_key in read_keys:
+        read_identifier = element_identifiers[read_key]
+        if read_identifier.lower().endswith('.png') or read_identifier.lower().endswith('.bmp') or \
+           (read_identifier.startswith('(') and read_identifier.endswith(')') and not any(c.isalpha() for c in read_identifier)):
+            if exist(read_identifier): read_results[read_key] = read(read_identifier)
+            else: read_results[read_key] = None
+        else:
+            read_identifiers.append(read_key)
+
+    if len(read_identifiers) > 0:
+        read_output = _tagui_eval('JSON.stringify(rpa_read_many(' + json.dumps([_sdq(element_identifiers[read_key]) for read_key in read_identifiers]) + '))')
+        try:
+            read_values = json.loads(read_output)
+        except ValueError:
+            show_error('[RPA][ERROR] - cannot read elements for read_many()')
+            return None
+        for read_key, read_value in zip(read_identifiers, read_values):
+            read_results[read_key] = _py23_read(read_value)
+
+    if isinstance(element_identifiers, dict): return read_results
+    else: return [read_results[read_key] for read_key in read_keys]
+
 def snap(element_identifier = None, filename_to_save = None, test_coord1 = None, test_coord2 = None, test_coord3 = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using snap()')
@@ -1219,12 +2992,49 @@ def snap(element_identifier = None, filename_to_save = None, test_coord1 = None,
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('snap ' + _sdq(element_identifier) + ' to ' + _esq(filename_to_save)):
+    elif not send('snap ' + _sdq(_strategy(element_identifier)) + ' to ' + _esq(_abs_file(filename_to_save))):
         return False
 
     else:
         return True
 
+def snap_bytes(element_identifier = 'page'):
+    """function to return png bytes of element, or list of elements from one screenshot, None if not found"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using snap_bytes()')
+        return None
+
+    if element_identifier is None or len(element_identifier) == 0:
+        show_error('[RPA][ERROR] - target missing for snap_bytes()')
+        return None
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - snap_bytes() requires init(chrome_browser = True)')
+        return None
+
+    if isinstance(element_identifier, list): snap_identifiers = element_identifier
+    else: snap_identifiers = [element_identifier]
+
+    for snap_identifier in snap_identifiers:
+        if snap_identifier.lower().endswith('.png') or snap_identifier.lower().endswith('.bmp') or \
+           (snap_identifier.startswith('(') and snap_identifier.endswith(')') and not any(c.isalpha() for c in snap_identifier)):
+            show_error('[RPA][ERROR] - snap_bytes() is for web elements, use snap() for ' + snap_identifier)
+            return None
+
+    snap_output = _tagui_eval('JSON.stringify(rpa_snap_many(' + json.dumps([_sdq(snap_identifier) for snap_identifier in snap_identifiers]) + '))')
+    try:
+        snap_results = json.loads(snap_output)
+        if not isinstance(snap_results, list): raise ValueError
+    except ValueError:
+        show_error('[RPA][ERROR] - cannot take screenshot for snap_bytes()')
+        return None
+
+    snap_images = [base64.b64decode(snap_result) if snap_result is not None else None for snap_result in snap_results]
+    if isinstance(element_identifier, list): return snap_images
+
+    if snap_images[0] is None: show_error('[RPA][ERROR] - cannot find ' + element_identifier)
+    return snap_images[0]
+
 def load(filename_to_load = None):
     if filename_to_load is None or filename_to_load == '':
         show_error('[RPA][ERROR] - filename missing for load()')
@@ -1415,12 +3225,106 @@ def table(element_identifier = None, filename_to_save = None):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('table ' + _sdq(element_identifier) + ' to ' + _esq(filename_to_save)):
+    elif not send('table ' + _sdq(element_identifier) + ' to ' + _esq(_abs_file(filename_to_save))):
         return False
 
     else:
         return True
 
+def _table_value(cell_text = ''):
+    """function to coerce numeric table cell text, eg '1,234.50' to 1234.5"""
+    # only plain numbers or numbers with thousands separators, eg not '1,5', 'nan' or 'inf'
+    number_text = cell_text.strip()
+    if not re.match(r'^-?(\d+|\d{1,3}(,\d{3})+)(\.\d+)?$', number_text): return cell_text
+    number_text = number_text.replace(',', '')
+    if '.' in number_text: return float(number_text)
+    else: return int(number_text)
+
+def _table_chunk(element_identifier = None, row_start = 0, row_count = None):
+    """function to get header, rows and total row count of table, from row_start"""
+    # number is nth table of webpage like table(), else identifier of table element
+    if element_identifier.isdigit(): element_identifier = '(//table)[' + element_identifier + ']'
+    table_output = _tagui_eval('JSON.stringify(rpa_table(\'' + _sdq(element_identifier) + '\', ' + str(row_start) + ', ' + json.dumps(row_count) + '))')
+    try:
+        table_chunk = json.loads(table_output)
+    except ValueError:
+        table_chunk = None
+    if table_chunk is None:
+        show_error('[RPA][ERROR] - cannot get table rows from ' + element_identifier)
+    return table_chunk
+
+def _table_check(element_identifier = None, function_name = ''):
+    """function to check that table element can be extracted to python"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using ' + function_name + '()')
+        return False
+
+    if element_identifier is None or element_identifier == '':
+        show_error('[RPA][ERROR] - target missing for ' + function_name + '()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - ' + function_name + '() requires init(chrome_browser = True)')
+        return False
+
+    if not exist(str(element_identifier)):
+        show_error('[RPA][ERROR] - cannot find ' + str(element_identifier))
+        return False
+
+    return True
+
+def table_data(element_identifier = None, columns = False, coerce = False):
+    """function to return table rows as list of tuples, or dict of columns if columns = True"""
+    if not _table_check(element_identifier, 'table_data'): return None
+
+    table_chunk = _table_chunk(str(element_identifier))
+    if table_chunk is None: return None
+
+    table_rows = [tuple(_table_value(_py23_read(cell)) if coerce else _py23_read(cell) for cell in row)
+                  for row in table_chunk['rows']]
+    table_header = table_chunk['header']
+    if table_header is not None: table_header = [_py23_read(cell) for cell in table_header]
+
+    # columns are keyed by header text if header row is detected, else by column number,
+    # also by column number for blank or duplicate header text, so that no column is lost
+    if columns:
+        column_count = max([len(row) for row in table_rows] + [len(table_header or [])])
+        column_keys = list(range(column_count))
+        for column_index, header_text in enumerate(table_header or []):
+            if header_text.strip() != '' and table_header.count(header_text) == 1:
+                column_keys[column_index] = header_text
+        table_columns = collections.OrderedDict((column_key, []) for column_key in column_keys)
+        for row in table_rows:
+            for column_index, column_key in enumerate(column_keys):
+                table_columns[column_key].append(row[column_index] if column_index < len(row) else None)
+        return table_columns
+
+    if table_header is not None: table_rows.insert(0, tuple(table_header))
+    return table_rows
+
+def table_rows(element_identifier = None, coerce = False, chunk_size = 500):
+    """function to iterate over table rows as tuples, fetching chunk_size rows at a time"""
+    if not _table_check(element_identifier, 'table_rows'): return iter([])
+    return _table_rows(_session(), str(element_identifier), coerce, int(chunk_size))
+
+def _table_rows(tagui_session = None, element_identifier = None, coerce = False, chunk_size = 500):
+    """generator for table_rows(), using session of table_rows() when each chunk is fetched"""
+    row_start = 0
+    while True:
+        with tagui_session:
+            table_chunk = _table_chunk(element_identifier, row_start, chunk_size)
+        if table_chunk is None: return
+
+        # header row is first row yielded if it is detected, same as table()
+        if row_start == 0 and table_chunk['header'] is not None:
+            yield tuple(_py23_read(cell) for cell in table_chunk['header'])
+
+        for row in table_chunk['rows']:
+            yield tuple(_table_value(_py23_read(cell)) if coerce else _py23_read(cell) for cell in row)
+
+        row_start += len(table_chunk['rows'])
+        if len(table_chunk['rows']) == 0 or row_start >= table_chunk['total']: return
+
 def wait(delay_in_seconds = 5.0):
     time.sleep(float(delay_in_seconds)); return True
 
@@ -1489,7 +3393,7 @@ def upload(element_identifier = None, filename_to_upload = None):
         show_error('[RPA][ERROR] - cannot find ' + element_identifier)
         return False
 
-    elif not send('upload ' + _sdq(element_identifier) + ' as ' + _esq(filename_to_upload)):
+    elif not send('upload ' + _sdq(_strategy(element_identifier)) + ' as ' + _esq(_abs_file(filename_to_upload))):
         return False
 
     else:
@@ -1540,43 +3444,23 @@ def frame(main_frame = None, sub_frame = None):
         show_error('[RPA][ERROR] - frame() requires init(chrome_browser = True)')
         return False
 
-    # reset webpage context to document root, by sending custom tagui javascript code
-    send('js chrome_step("Runtime.evaluate", {expression: "mainframe_context = null"})')
-    send('js chrome_step("Runtime.evaluate", {expression: "subframe_context = null"})')
-    send('js chrome_context = "document"; frame_step_offset_x = 0; frame_step_offset_y = 0;')
+    if main_frame is None: main_frame = ''
+    if sub_frame is None: sub_frame = ''
 
-    # return True if no parameter, after resetting webpage context above
-    if main_frame is None or main_frame == '':
-        return True
+    # reset webpage context and set it to main frame and sub frame in one instruction,
+    # frames found before on same webpage are set from cache without waiting for them
+    frame_result = _tagui_eval('rpa_frame(' + json.dumps(_sdq(main_frame)) + ', ' + json.dumps(_sdq(sub_frame)) + ')')
 
-    # set webpage context to main frame specified, by sending custom tagui javascript code
-    frame_identifier = '(//frame|//iframe)[@name="' + main_frame + '" or @id="' + main_frame + '"]'
-    if not exist(frame_identifier):
+    if frame_result == 'main':
         show_error('[RPA][ERROR] - cannot find frame with @name or @id as \'' + main_frame + '\'')
         return False
 
-    send('js new_context = "mainframe_context"')
-    send('js frame_xpath = \'(//frame|//iframe)[@name="' + main_frame + '" or @id="' + main_frame + '"]\'')
-    send('js frame_rect = chrome.getRect(xps666(frame_xpath))')
-    send('js frame_step_offset_x = frame_rect.left; frame_step_offset_y = frame_rect.top;')
-    send('js chrome_step("Runtime.evaluate", {expression: new_context + " = document.evaluate(\'" + frame_xpath + "\'," + chrome_context + ",null,XPathResult.ORDERED_NODE_SNAPSHOT_TYPE,null).snapshotItem(0).contentDocument"})')
-    send('js chrome_context = new_context')
-
-    # set webpage context to sub frame if specified, by sending custom tagui javascript code
-    if sub_frame is not None and sub_frame != '':
-        frame_identifier = '(//frame|//iframe)[@name="' + sub_frame + '" or @id="' + sub_frame + '"]'
-        if not exist(frame_identifier):
-            show_error('[RPA][ERROR] - cannot find sub frame with @name or @id as \'' + sub_frame + '\'')
-            return False
-
-        send('js new_context = "subframe_context"')
-        send('js frame_xpath = \'(//frame|//iframe)[@name="' + sub_frame + '" or @id="' + sub_frame + '"]\'')
-        send('js frame_rect = chrome.getRect(xps666(frame_xpath))')
-        send('js frame_step_offset_x = frame_rect.left; frame_step_offset_y = frame_rect.top;')
-        send('js chrome_step("Runtime.evaluate", {expression: new_context + " = document.evaluate(\'" + frame_xpath + "\'," + chrome_context + ",null,XPathResult.ORDERED_NODE_SNAPSHOT_TYPE,null).snapshotItem(0).contentDocument"})')
-        send('js chrome_context = new_context')
+    elif frame_result == 'sub':
+        show_error('[RPA][ERROR] - cannot find sub frame with @name or @id as \'' + sub_frame + '\'')
+        return False
 
-    return True
+    else:
+        return frame_result == 'true'
 
 def popup(string_in_url = None):
     if not _started():
@@ -1588,7 +3472,7 @@ def popup(string_in_url = None):
         return False
 
     # reset webpage context to main page, by sending custom tagui javascript code
-    send('js if (chrome_targetid !== "") {found_targetid = chrome_targetid; chrome_targetid = ""; chrome_step("Target.detachFromTarget", {sessionId: found_targetid});}')
+    send('js if (chrome_targetid !== "") rpa_tab_reset()')
 
     # return True if no parameter, after resetting webpage context above
     if string_in_url is None or string_in_url == '':
@@ -1602,14 +3486,148 @@ def popup(string_in_url = None):
     send('js chrome_targetid = found_targetid')
 
     # check if chrome_targetid is successfully set to sessionid of popup tab
-    send('dump chrome_targetid to rpa_python.txt')
-    popup_result = _tagui_output()
+    popup_result = _tagui_fetch('chrome_targetid')
     if popup_result != '':
         return True
     else:
         show_error('[RPA][ERROR] - cannot find popup tab containing URL string \'' + string_in_url + '\'')
         return False
 
+def tab_open(webpage_url = None):
+    """function to open tab in background in same browser, returns tab number for tab()"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using tab_open()')
+        return None
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - tab_open() requires init(chrome_browser = True)')
+        return None
+
+    if webpage_url is None or webpage_url == '': webpage_url = 'about:blank'
+    if webpage_url.lower().startswith('www.'): webpage_url = 'https://' + webpage_url
+
+    # tab loads url in background, while other tabs carry on with next steps
+    tab_number = _tagui_eval('rpa_tab_open(' + json.dumps(webpage_url) + ')')
+    if not tab_number.isdigit():
+        show_error('[RPA][ERROR] - cannot open tab for ' + webpage_url)
+        return None
+    return int(tab_number)
+
+def tab(tab_number = None):
+    """function to set webpage context to tab from tab_open(), 0 for main tab"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using tab()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - tab() requires init(chrome_browser = True)')
+        return False
+
+    # return current tab number if no parameter
+    if tab_number is None:
+        tab_result = _tagui_eval('rpa_tab_current')
+        if tab_result.isdigit(): return int(tab_result)
+        else: return 0
+
+    if _tagui_eval('rpa_tab(' + str(int(tab_number)) + ')') == 'true':
+        return True
+    else:
+        show_error('[RPA][ERROR] - cannot find tab ' + str(tab_number))
+        return False
+
+def tab_url(tab_number = None, webpage_url = None):
+    """function to go to url on tab without switching to it or waiting for it to load"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using tab_url()')
+        return ''
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - tab_url() requires init(chrome_browser = True)')
+        return ''
+
+    if tab_number is None:
+        show_error('[RPA][ERROR] - tab number missing for tab_url()')
+        return ''
+
+    if webpage_url is None: webpage_url = ''
+    if webpage_url.lower().startswith('www.'): webpage_url = 'https://' + webpage_url
+    if webpage_url != '' and not webpage_url.startswith('http://') and not webpage_url.startswith('https://'):
+        show_error('[RPA][ERROR] - URL does not begin with http:// or https:// ')
+        return False
+
+    # return url of tab if no webpage_url, else True when url starts loading on tab
+    tab_output = _tagui_eval('JSON.stringify(rpa_tab_url(' + str(int(tab_number)) + ', ' + json.dumps(webpage_url) + '))')
+    try:
+        tab_result = json.loads(tab_output)
+    except ValueError:
+        tab_result = None
+
+    if tab_result is None:
+        show_error('[RPA][ERROR] - cannot find tab ' + str(tab_number) + ' or load URL')
+        return False if webpage_url != '' else ''
+    elif webpage_url != '':
+        return True
+    else:
+        return tab_result
+
+def tab_close(tab_number = None):
+    """function to close tab from tab_open(), webpage context goes to main tab if current"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using tab_close()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - tab_close() requires init(chrome_browser = True)')
+        return False
+
+    if tab_number is None:
+        show_error('[RPA][ERROR] - tab number missing for tab_close()')
+        return False
+
+    if _tagui_eval('rpa_tab_close(' + str(int(tab_number)) + ')') == 'true':
+        return True
+    else:
+        show_error('[RPA][ERROR] - cannot find tab ' + str(tab_number) + ' to close')
+        return False
+
+def block(patterns = None, resource_types = None):
+    """function to block requests matching url patterns or resource types, for faster page loads"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using block()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - block() requires init(chrome_browser = True)')
+        return False
+
+    # return blocked url patterns and estimated requests blocked on current webpage,
+    # counted from elements with matching url that did not load, eg broken images
+    if patterns is None and resource_types is None:
+        block_output = _tagui_eval('JSON.stringify({patterns: rpa_blocked, requests: rpa_block_count()})')
+        try:
+            return json.loads(block_output)
+        except ValueError:
+            return {'patterns': [], 'requests': 0}
+
+    if patterns is None: patterns = []
+    if resource_types is None: resource_types = []
+    if not isinstance(patterns, (list, tuple)): patterns = [patterns]
+    if not isinstance(resource_types, (list, tuple)): resource_types = [resource_types]
+
+    # block() with empty patterns and resource_types stops blocking
+    block_patterns = list(patterns)
+    for resource_type in resource_types:
+        if resource_type not in _tagui_block_types:
+            show_error('[RPA][ERROR] - resource type ' + str(resource_type) + ' invalid, use ' + ', '.join(sorted(_tagui_block_types)))
+            return False
+        block_patterns.extend([block_pattern for block_pattern in _tagui_block_types[resource_type] if block_pattern not in block_patterns])
+
+    if _tagui_eval('rpa_block(' + json.dumps(block_patterns) + ')') == 'true':
+        return True
+    else:
+        show_error('[RPA][ERROR] - cannot block requests on all tabs')
+        return False
+
 def api(url_to_query = None):
     print('[RPA][INFO] - although TagUI supports calling APIs with headers and body,')
     print('[RPA][INFO] - recommend using requests package with lots of online docs')
@@ -1645,10 +3663,126 @@ def dom(statement_to_run = None):
 
     else:
         send('dom ' + statement_to_run)
-        send('dump dom_result to rpa_python.txt')
-        dom_result = _tagui_output()
+        dom_result = _tagui_fetch('dom_result')
         return dom_result
 
+def dom_json(statement_to_run = None):
+    """function to run dom statement, or list of statements in one round-trip, returning python objects"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using dom_json()')
+        return None
+
+    if statement_to_run is None or len(statement_to_run) == 0:
+        show_error('[RPA][ERROR] - statement(s) missing for dom_json()')
+        return None
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - dom_json() requires init(chrome_browser = True)')
+        return None
+
+    if isinstance(statement_to_run, list): dom_statements = statement_to_run
+    else: dom_statements = [statement_to_run]
+
+    dom_output = _tagui_eval('JSON.stringify(rpa_dom_json(' + json.dumps(dom_statements) + '))')
+    try:
+        dom_results = json.loads(dom_output)
+        if not isinstance(dom_results, list): raise ValueError
+    except ValueError:
+        show_error('[RPA][ERROR] - cannot run statement(s) for dom_json()')
+        return None
+
+    # result is None for statement with error, after showing its error message
+    dom_values = []
+    for dom_statement, dom_result in zip(dom_statements, dom_results):
+        if 'error' in dom_result:
+            show_error('[RPA][ERROR] - ' + _py23_read(dom_result['error']) + ' in dom_json() statement ' + dom_statement)
+            dom_values.append(None)
+        else:
+            dom_values.append(dom_result.get('value'))
+
+    if isinstance(statement_to_run, list): return dom_values
+    else: return dom_values[0]
+
+class _Stream(object):
+    """iterator over chunks of text from stream(), truncated is True if size_limit is reached"""
+
+    def __init__(self, tagui_session = None, stream_id = 0, stream_size = 0, chunk_size = 1048576, size_limit = None):
+        self._tagui_session = tagui_session; self._stream_id = stream_id
+        self._chunk_size = chunk_size; self._chunk_start = 0
+        self.size = stream_size; self.truncated = False
+        self._stream_end = stream_size; self._stream_open = True
+        if size_limit is not None and stream_size > size_limit:
+            self._stream_end = size_limit; self.truncated = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._chunk_start >= self._stream_end:
+            self.close(); raise StopIteration
+
+        # text kept in webpage is removed together with last chunk
+        chunk_size = min(self._chunk_size, self._stream_end - self._chunk_start)
+        chunk_last = self._chunk_start + chunk_size >= self._stream_end
+        if chunk_last: self._stream_open = False
+        with self._tagui_session:
+            chunk_output = _tagui_eval('JSON.stringify(rpa_stream_chunk(' + str(self._stream_id) + ', ' + str(self._chunk_start) +
+                                       ', ' + str(chunk_size) + ', ' + str(chunk_last).lower() + '))')
+        try:
+            chunk_result = json.loads(chunk_output)
+        except ValueError:
+            chunk_result = None
+        if chunk_result is None:
+            self._chunk_start = self._stream_end; self._stream_open = False
+            with self._tagui_session:
+                show_error('[RPA][ERROR] - cannot get text for stream(), webpage may have changed')
+            raise StopIteration
+
+        # chunk may be a code unit shorter or longer, to keep surrogate pairs whole
+        self._chunk_start += chunk_result['size']
+        return _py23_read(chunk_result['text'])
+
+    next = __next__
+
+    def close(self):
+        """remove text kept in webpage if stream is not iterated to the end"""
+        if self._stream_open:
+            self._stream_open = False
+            with self._tagui_session:
+                _tagui_eval('JSON.stringify(rpa_stream_chunk(' + str(self._stream_id) + ', 0, 0, true))')
+        return True
+
+def stream(source = 'text', chunk_size = 1048576, size_limit = None):
+    """function to return iterator of text chunks for 'text', 'page' or dom statement result"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using stream()')
+        return iter([])
+
+    if source is None or source == '':
+        show_error('[RPA][ERROR] - source missing for stream()')
+        return iter([])
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - stream() requires init(chrome_browser = True)')
+        return iter([])
+
+    if int(chunk_size) <= 0:
+        show_error('[RPA][ERROR] - chunk_size must be more than 0 for stream()')
+        return iter([])
+
+    # text is kept in webpage by its instruction id, for chunks to be fetched separately
+    stream_id = _session()._tagui_id
+    stream_output = _tagui_eval('JSON.stringify(rpa_stream(' + str(stream_id) + ', ' + json.dumps(source) + '))')
+    try:
+        stream_size = json.loads(stream_output)
+    except ValueError:
+        stream_size = None
+    if not isinstance(stream_size, int):
+        show_error('[RPA][ERROR] - cannot get text of ' + source + ' for stream()')
+        return iter([])
+
+    return _Stream(_session(), stream_id, stream_size, int(chunk_size), size_limit)
+
 def vision(command_to_run = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using vision()')
@@ -1673,13 +3807,13 @@ def timeout(timeout_in_seconds = None):
         show_error('[RPA][ERROR] - use init() before using timeout()')
         return False
 
-    global _tagui_timeout
+    tagui_session = _session()
 
     if timeout_in_seconds is None:
-        return float(_tagui_timeout)
+        return float(tagui_session._tagui_timeout)
 
     else:
-        _tagui_timeout = float(timeout_in_seconds)
+        tagui_session._tagui_timeout = float(timeout_in_seconds)
 
     if not send('timeout ' + str(timeout_in_seconds)):
         return False
@@ -1687,6 +3821,32 @@ def timeout(timeout_in_seconds = None):
     else:
         return True
 
+def adaptive(on_off = None, percentile = 95):
+    """function to cap wait for each identifier at percentile of its recent wait times"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using adaptive()')
+        return None
+
+    tagui_session = _session()
+
+    # return current wait in seconds for each identifier, None if not capped yet
+    if on_off is None:
+        adaptive_waits = {}
+        for element_identifier in tagui_session._tagui_latencies:
+            wait_milliseconds = _wait_time(element_identifier)
+            if wait_milliseconds == 'null': adaptive_waits[element_identifier] = None
+            else: adaptive_waits[element_identifier] = int(wait_milliseconds) / 1000.0
+        return adaptive_waits
+
+    elif on_off:
+        tagui_session._tagui_adaptive = float(percentile)
+        return True
+
+    else:
+        tagui_session._tagui_adaptive = None
+        tagui_session._tagui_latencies = {}
+        return True
+
 def present(element_identifier = None):
     if not _started():
         show_error('[RPA][ERROR] - use init() before using present()')
@@ -1719,9 +3879,8 @@ def present(element_identifier = None):
                     show_error('[RPA][ERROR] - x, y coordinates require init(visual_automation = True)')
                     return False
 
-    send('present_result = present(\'' + _sdq(element_identifier) + '\').toString()')
-    send('dump present_result to rpa_python.txt')
-    if _tagui_output() == 'true':
+    send('present_result = present(\'' + _sdq(_visual_file(element_identifier)) + '\').toString()')
+    if _tagui_fetch('present_result') == 'true':
         return True
     else:
         return False
@@ -1739,8 +3898,7 @@ def count(element_identifier = None):
         return int(0)
 
     send('count_result = count(\'' + _sdq(element_identifier) + '\').toString()')
-    send('dump count_result to rpa_python.txt')
-    return int(_tagui_output())
+    return int(_tagui_fetch('count_result'))
 
 def title():
     if not _started():
@@ -1751,8 +3909,7 @@ def title():
         show_error('[RPA][ERROR] - title() requires init(chrome_browser = True)')
         return ''
 
-    send('dump title() to rpa_python.txt')
-    title_result = _tagui_output()
+    title_result = _tagui_fetch('title()')
     return title_result
 
 def text():
@@ -1764,8 +3921,7 @@ def text():
         show_error('[RPA][ERROR] - text() requires init(chrome_browser = True)')
         return ''
 
-    send('dump text() to rpa_python.txt')
-    text_result = _tagui_output()
+    text_result = _tagui_fetch('text()')
     return text_result
 
 def timer():
@@ -1773,10 +3929,37 @@ def timer():
         show_error('[RPA][ERROR] - use init() before using timer()')
         return float(0)
 
-    send('dump timer() to rpa_python.txt')
-    timer_result = _tagui_output()
+    timer_result = _tagui_fetch('timer()')
     return float(timer_result)
 
+def snapshot(counts = None, present = None, reads = None):
+    """function to return url, title, text, timer, counts, presence and reads of webpage in one round-trip"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using snapshot()')
+        return None
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - snapshot() requires init(chrome_browser = True)')
+        return None
+
+    snapshot_counts = [_sdq(identifier) for identifier in (counts or [])]
+    snapshot_present = [_sdq(identifier) for identifier in (present or [])]
+    snapshot_reads = [_sdq(identifier) for identifier in (reads or [])]
+
+    snapshot_output = _tagui_eval('JSON.stringify(rpa_snapshot(' + json.dumps(snapshot_counts) + ', ' +
+                                  json.dumps(snapshot_present) + ', ' + json.dumps(snapshot_reads) + '))')
+    try:
+        snapshot_result = json.loads(snapshot_output)
+    except ValueError:
+        show_error('[RPA][ERROR] - cannot get snapshot of webpage')
+        return None
+
+    return _Snapshot(url = _py23_read(snapshot_result['url']), title = _py23_read(snapshot_result['title']),
+                     text = _py23_read(snapshot_result['text']), timer = float(snapshot_result['timer']),
+                     counts = collections.OrderedDict(zip(counts or [], [int(count) for count in snapshot_result['counts']])),
+                     present = collections.OrderedDict(zip(present or [], [bool(found) for found in snapshot_result['present']])),
+                     reads = collections.OrderedDict(zip(reads or [], [_py23_read(text) for text in snapshot_result['reads']])))
+
 def mouse_xy():
     if not _started():
         show_error('[RPA][ERROR] - use init() before using mouse_xy()')
@@ -1786,8 +3969,7 @@ def mouse_xy():
         show_error('[RPA][ERROR] - mouse_xy() requires init(visual_automation = True)')
         return ''
 
-    send('dump mouse_xy() to rpa_python.txt')
-    mouse_xy_result = _tagui_output()
+    mouse_xy_result = _tagui_fetch('mouse_xy()')
     return mouse_xy_result
 
 def mouse_x():
@@ -1799,8 +3981,7 @@ def mouse_x():
         show_error('[RPA][ERROR] - mouse_x() requires init(visual_automation = True)')
         return int(0)
 
-    send('dump mouse_x() to rpa_python.txt')
-    mouse_x_result = _tagui_output()
+    mouse_x_result = _tagui_fetch('mouse_x()')
     return int(mouse_x_result)
 
 def mouse_y():
@@ -1812,8 +3993,7 @@ def mouse_y():
         show_error('[RPA][ERROR] - mouse_y() requires init(visual_automation = True)')
         return int(0)
 
-    send('dump mouse_y() to rpa_python.txt')
-    mouse_y_result = _tagui_output()
+    mouse_y_result = _tagui_fetch('mouse_y()')
     return int(mouse_y_result)
 
 def clipboard(text_to_put = None):
@@ -1826,8 +4006,7 @@ def clipboard(text_to_put = None):
         return False
 
     if text_to_put is None:
-        send('dump clipboard() to rpa_python.txt')
-        clipboard_result = _tagui_output()
+        clipboard_result = _tagui_fetch('clipboard()')
         return clipboard_result
 
     elif not send("js clipboard('" + text_to_put.replace("'",'[BACKSLASH_QUOTE]') + "')"):
@@ -1837,13 +4016,13 @@ def clipboard(text_to_put = None):
         return True
 
 def download_location(location = None):
-    global _tagui_download_directory
+    tagui_session = _session()
     if not _started():
         show_error('[RPA][ERROR] - use init() before using download_location()')
         return False
 
     if location is None:
-        return _tagui_download_directory
+        return tagui_session._tagui_download_directory
 
     if "'" in location:
         show_error('[RPA][ERROR] - single quote in location not supported here')
@@ -1856,8 +4035,67 @@ def download_location(location = None):
         return False
 
     else:
-        _tagui_download_directory = location
+        tagui_session._tagui_download_directory = location
+        return True
+
+def save_state(filename_to_save = None):
+    """function to save cookies, localStorage and sessionStorage of webpage to json file"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using save_state()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - save_state() requires init(chrome_browser = True)')
+        return False
+
+    if filename_to_save is None or filename_to_save == '':
+        show_error('[RPA][ERROR] - filename missing for save_state()')
+        return False
+
+    state_output = _tagui_eval('JSON.stringify(rpa_save_state())')
+    try:
+        browser_state = json.loads(state_output)
+    except ValueError:
+        browser_state = None
+
+    if not isinstance(browser_state, dict):
+        show_error('[RPA][ERROR] - cannot get cookies and storage for save_state()')
+        return False
+
+    # compact json saved atomically, so a run never loads a partial state file
+    return _atomic_dump(json.dumps(browser_state, separators = (',', ':')), filename_to_save)
+
+def load_state(filename_to_load = None):
+    """function to restore cookies and storage saved by save_state(), eg to skip login"""
+    if not _started():
+        show_error('[RPA][ERROR] - use init() before using load_state()')
+        return False
+
+    if not _chrome():
+        show_error('[RPA][ERROR] - load_state() requires init(chrome_browser = True)')
+        return False
+
+    if filename_to_load is None or filename_to_load == '':
+        show_error('[RPA][ERROR] - filename missing for load_state()')
+        return False
+
+    state_text = load(filename_to_load)
+    if state_text == '': return False
+
+    try:
+        browser_state = json.loads(state_text)
+    except ValueError:
+        browser_state = None
+
+    if not isinstance(browser_state, dict) or 'cookies' not in browser_state or 'origins' not in browser_state:
+        show_error('[RPA][ERROR] - cannot load cookies and storage from ' + filename_to_load)
+        return False
+
+    if _tagui_eval('rpa_load_state(' + json.dumps(browser_state, separators = (',', ':')) + ')') == 'true':
         return True
+    else:
+        show_error('[RPA][ERROR] - cannot set cookies from ' + filename_to_load)
+        return False
 
 def get_text(source_text = None, left = None, right = None, count = 1):
     if source_text is None or left is None or right is None:
@@ -1890,3 +4128,372 @@ def del_chars(source_text = None, characters = None):
         source_text = source_text.replace(character, '')
 
     return source_text
+
+class _TaguiConnection(object):
+    """class for connection to serve() daemon, with subprocess interface used by session"""
+
+    def __init__(self, tagui_socket = None):
+        self._socket = tagui_socket
+        self.stdin = tagui_socket.makefile('wb')
+        self.stdout = tagui_socket.makefile('rb')
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        self.kill(); return self.returncode
+
+    def kill(self):
+        if self.returncode is not None: return
+        self.returncode = 0
+        try:
+            self.stdin.close(); self._socket.close()
+        except Exception as e:
+            pass
+
+def _tagui_attach(socket_path = None):
+    """function to connect session to tagui process of serve() daemon on unix socket"""
+    tagui_session = _session()
+
+    if not hasattr(socket, 'AF_UNIX'):
+        show_error('[RPA][ERROR] - init(attach) requires Unix socket support on ' + platform.system())
+        return False
+
+    try:
+        tagui_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        tagui_socket.connect(socket_path)
+        tagui_connection = _TaguiConnection(tagui_socket)
+
+        # daemon sends one header line with session state, before relaying output
+        daemon_header = json.loads(_py23_decode(tagui_connection.stdout.readline()) or '{}')
+        if not daemon_header.get('started', False):
+            tagui_connection.kill()
+            show_error('[RPA][ERROR] - ' + daemon_header.get('error', 'cannot attach to ' + socket_path))
+            return False
+
+        tagui_session._process = tagui_connection
+        tagui_session._tagui_output_queue = queue.Queue()
+        tagui_reader = threading.Thread(target = _tagui_reader, args = (tagui_connection, tagui_session._tagui_output_queue))
+        tagui_reader.daemon = True; tagui_reader.start()
+
+        tagui_session._tagui_id = daemon_header['id']
+        tagui_session._tagui_results.clear()
+        tagui_session._tagui_visual = daemon_header['visual']
+        tagui_session._tagui_chrome = daemon_header['chrome']
+        tagui_session._tagui_timeout = daemon_header['timeout']
+        tagui_session._tagui_directory = daemon_header['directory']
+        tagui_session._tagui_init_directory = daemon_header['directory']
+        tagui_session._tagui_download_directory = os.getcwd()
+        tagui_session._tagui_started = True
+        return True
+
+    except Exception as e:
+        show_error('[RPA][ERROR] - cannot attach to ' + str(socket_path) + ' - ' + str(e))
+        return False
+
+def _tagui_detach():
+    """function to disconnect session from serve() daemon, leaving its tagui process running"""
+    tagui_session = _session()
+
+    # daemon takes over instruction id to continue from for its next client
+    _tagui_write('[RPA][DETACH] ' + str(tagui_session._tagui_id) + '\n')
+
+    # wait for daemon to close connection, after session is ready for next client
+    wait_deadline = _tagui_deadline_time()
+    while _tagui_read(wait_deadline) not in ['', None]: pass
+    tagui_session._process.kill()
+    _tagui_ended(tagui_session)
+    return True
+
+def _chrome_option(init_options = None):
+    """function to check if init() options start chrome browser, directly or in headless mode"""
+    return init_options.get('chrome_browser', True) or init_options.get('headless_mode', False)
+
+def serve(socket_path = 'rpa_python.sock', sessions = 1, idle_timeout = 600, keep_cookies = False, **init_options):
+    """function to run tagui sessions as daemon for scripts to connect using init(attach = socket_path)"""
+    # each client starts like a new session, browser cookies are kept between clients only if keep_cookies
+
+    if not hasattr(socket, 'AF_UNIX'):
+        show_error('[RPA][ERROR] - serve() requires Unix socket support on ' + platform.system())
+        return False
+
+    # only one session at a time can use chrome, see init()
+    if int(sessions) > 1 and _chrome_option(init_options):
+        show_error('[RPA][ERROR] - serve() with sessions > 1 requires chrome_browser = False, as sessions share Chrome')
+        return False
+
+    # start sessions once and keep them warm, each client gets its own idle session
+    daemon_sessions = queue.Queue()
+    for session_count in range(int(sessions)):
+        daemon_session = Session()
+        if not daemon_session.init(**init_options): return False
+        daemon_sessions.put(daemon_session)
+
+    if os.path.exists(socket_path): os.remove(socket_path)
+    daemon_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    daemon_socket.bind(socket_path); daemon_socket.listen(5)
+    daemon_socket.settimeout(1.0)
+    print('[RPA][INFO] - serving TagUI on ' + socket_path + ', use init(attach = \'' + socket_path + '\')')
+
+    # to track clients attached, for shutting down daemon after idle_timeout
+    daemon_state = {'clients': 0, 'idle_since': time.time()}
+    daemon_lock = threading.Lock()
+
+    def daemon_client(client_socket, daemon_session):
+        try:
+            _serve_client(client_socket, daemon_session, init_options, keep_cookies)
+        finally:
+            with daemon_lock:
+                daemon_state['clients'] -= 1; daemon_state['idle_since'] = time.time()
+            # session is idle again before client sees connection closed
+            daemon_sessions.put(daemon_session)
+            try:
+                client_socket.close()
+            except Exception as e:
+                pass
+
+    try:
+        while True:
+            try:
+                client_socket, client_address = daemon_socket.accept()
+            except socket.timeout:
+                with daemon_lock:
+                    if daemon_state['clients'] == 0 and idle_timeout and \
+                    time.time() - daemon_state['idle_since'] > idle_timeout: break
+                continue
+
+            # refuse client if all sessions are attached, instead of sharing a session
+            try:
+                daemon_session = daemon_sessions.get_nowait()
+            except queue.Empty:
+                client_socket.sendall(_py23_encode(json.dumps({'started': False,
+                    'error': 'all ' + str(sessions) + ' sessions of ' + socket_path + ' are in use'}) + '\n'))
+                client_socket.close(); continue
+
+            with daemon_lock: daemon_state['clients'] += 1
+            client_thread = threading.Thread(target = daemon_client, args = (client_socket, daemon_session))
+            client_thread.daemon = True; client_thread.start()
+
+    finally:
+        daemon_socket.close()
+        if os.path.exists(socket_path): os.remove(socket_path)
+        while not daemon_sessions.empty():
+            daemon_session = daemon_sessions.get()
+            if daemon_session._tagui_started: daemon_session.close()
+
+    return True
+
+def _serve_client(client_socket = None, daemon_session = None, init_options = None, keep_cookies = False):
+    """function to relay live mode input and output between client and session of serve() daemon"""
+
+    # restart session if its tagui process has ended for whatever reason
+    if not daemon_session._tagui_started or daemon_session._process.poll() is not None:
+        if daemon_session._tagui_started: _tagui_cleanup(daemon_session)
+        if not daemon_session.init(**init_options):
+            client_socket.sendall(_py23_encode(json.dumps({'started': False,
+                'error': 'TagUI session of daemon cannot be started'}) + '\n'))
+            return
+
+    # discard output left from previous client before relaying output
+    while not daemon_session._tagui_output_queue.empty():
+        if daemon_session._tagui_output_queue.get() is None:
+            daemon_session._tagui_output_queue.put(None); break
+
+    client_socket.sendall(_py23_encode(json.dumps({'started': True, 'id': daemon_session._tagui_id,
+        'visual': daemon_session._tagui_visual, 'chrome': daemon_session._tagui_chrome,
+        'timeout': daemon_session._tagui_timeout,
+        'directory': daemon_session._tagui_init_directory}) + '\n'))
+
+    client_state = {'attached': True}
+
+    def client_output():
+        while client_state['attached']:
+            try:
+                tagui_out = daemon_session._tagui_output_queue.get(True, _tagui_delay)
+            except queue.Empty:
+                continue
+            if tagui_out is None:
+                daemon_session._tagui_output_queue.put(None)
+                client_socket.shutdown(socket.SHUT_RDWR); return
+            try:
+                client_socket.sendall(_py23_encode(tagui_out))
+            except Exception as e:
+                return
+
+    output_thread = threading.Thread(target = client_output)
+    output_thread.daemon = True; output_thread.start()
+
+    client_input = client_socket.makefile('rb')
+    try:
+        for client_line in iter(client_input.readline, b''):
+            if client_line.startswith(b'[RPA][DETACH]'):
+                daemon_session._tagui_id = int(client_line.split()[-1]); break
+            daemon_session._process.stdin.write(client_line)
+            daemon_session._process.stdin.flush()
+    except Exception as e:
+        pass
+
+    client_state['attached'] = False
+    output_thread.join(); client_input.close()
+
+    # reset state changed by client, also when client ends without detaching
+    _serve_reset(daemon_session, keep_cookies)
+
+def _serve_reset(daemon_session = None, keep_cookies = False):
+    """function to reset state changed by client of serve() daemon, browser cookies too unless keep_cookies"""
+    if not daemon_session._tagui_started or daemon_session._process.poll() is not None: return False
+
+    # discard output left from client, so it is not taken as output of reset instructions
+    while not daemon_session._tagui_output_queue.empty():
+        if daemon_session._tagui_output_queue.get() is None:
+            daemon_session._tagui_output_queue.put(None); return False
+
+    # timeout of daemon session is restored, so header for next client has actual timeout
+    with daemon_session:
+        reset_instructions = ['timeout ' + ('%g' % daemon_session._tagui_timeout)]
+        if daemon_session._tagui_chrome: reset_instructions.append('js rpa_serve_reset(' + json.dumps(bool(keep_cookies)) + ')')
+        return send_many(reset_instructions)
+
+class Pool(object):
+    """class for pool of warm tagui sessions taking jobs from a bounded queue in parallel"""
+
+    def __init__(self, size = 2, queue_size = None, **init_options):
+        # init_options are passed to init() of each session, eg headless_mode = True
+        self._size = int(size)
+        self._init_options = init_options
+
+        # bounded job queue blocks submit() when full, as backpressure on producer
+        if queue_size is None: queue_size = self._size * 2
+        self._jobs = queue.Queue(int(queue_size))
+        self._results = queue.Queue()
+
+        # to track workers and their utilisation, jobs done and session restarts
+        self._workers = []; self._sessions = []
+        self._start_time = None; self._busy_time = []
+        self._jobs_done = []; self._restarts = []
+
+        # to track jobs submitted and results collected, for results() to end
+        self._lock = threading.Lock()
+        self._submitted = 0; self._collected = 0
+
+    def __enter__(self):
+        self.start(); return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(); return False
+
+    def start(self):
+        """start sessions once and keep them warm for jobs"""
+        if len(self._workers) > 0: return True
+
+        # only one session at a time can use chrome, see init()
+        if self._size > 1 and _chrome_option(self._init_options):
+            show_error('[RPA][ERROR] - Pool() with size > 1 requires chrome_browser = False, as sessions share Chrome')
+            return False
+
+        self._start_time = time.time(); self._sessions = []
+        self._busy_time = []; self._jobs_done = []; self._restarts = []
+        for worker_index in range(self._size):
+            self._sessions.append(Session())
+            self._busy_time.append(0.0); self._jobs_done.append(0); self._restarts.append(0)
+            pool_worker = threading.Thread(target = self._worker, args = (worker_index,))
+            pool_worker.daemon = True; pool_worker.start()
+            self._workers.append(pool_worker)
+        return True
+
+    def _worker_init(self, worker_index = 0):
+        """init session of worker, returning exception if init fails instead of ending worker"""
+        try:
+            if self._sessions[worker_index].init(**self._init_options): return None
+            return Exception('[RPA][ERROR] - cannot init() session of pool worker ' + str(worker_index))
+        except Exception as e:
+            return e
+
+    def _worker(self, worker_index = 0):
+        """run jobs from queue on session of this worker until None is received"""
+        pool_session = self._sessions[worker_index]
+        with pool_session:
+            init_error = self._worker_init(worker_index)
+            while True:
+                pool_job = self._jobs.get()
+                if pool_job is None: break
+                job_function, job_args, job_results = pool_job
+
+                # restart session if its init failed or tagui process has ended for whatever reason
+                if init_error is not None or not pool_session._tagui_started or pool_session._process.poll() is not None:
+                    if pool_session._tagui_started: _tagui_cleanup(pool_session)
+                    init_error = self._worker_init(worker_index)
+                    self._restarts[worker_index] += 1
+
+                # job runs with module functions bound to this worker session,
+                # exception of failed init is result of job so that results never block
+                job_start_time = time.time()
+                if init_error is not None:
+                    job_result = init_error
+                else:
+                    try:
+                        job_result = job_function(*job_args)
+                    except Exception as e:
+                        job_result = e
+                self._busy_time[worker_index] += time.time() - job_start_time
+                self._jobs_done[worker_index] += 1
+                job_results.put((job_args, job_result))
+
+            if pool_session._tagui_started: pool_session.close()
+
+    def submit(self, job_function = None, *job_args):
+        """queue job_function(*job_args) to run on next free session, blocks if queue is full"""
+        if len(self._workers) == 0 and not self.start(): return False
+        with self._lock: self._submitted += 1
+        self._jobs.put((job_function, job_args, self._results))
+        return True
+
+    def results(self):
+        """return generator of (job_args, result) in completion order for jobs submitted"""
+        while True:
+            with self._lock:
+                if self._collected >= self._submitted: return
+                self._collected += 1
+            yield self._results.get()
+
+    def map(self, job_function = None, job_items = None):
+        """run job_function(item) for each item, eg URLs, and return (item, result) in completion order"""
+        if len(self._workers) == 0 and not self.start(): return
+        job_items = list(job_items or [])
+
+        # results of map() have own queue, apart from submit() jobs collected by results()
+        map_results = queue.Queue()
+
+        # feed jobs from a thread, so results can be consumed while queue is full
+        def pool_feeder():
+            for job_item in job_items: self._jobs.put((job_function, (job_item,), map_results))
+        feeder_thread = threading.Thread(target = pool_feeder)
+        feeder_thread.daemon = True; feeder_thread.start()
+
+        for job_count in range(len(job_items)):
+            job_args, job_result = map_results.get()
+            yield job_args[0], job_result
+
+    def stats(self):
+        """return list of utilisation, jobs done and restarts for each worker"""
+        if self._start_time is None: return []
+        elapsed_time = max(time.time() - self._start_time, 0.000001)
+        return [{'worker': worker_index, 'utilisation': self._busy_time[worker_index] / elapsed_time,
+                 'jobs': self._jobs_done[worker_index], 'restarts': self._restarts[worker_index]}
+                for worker_index in range(len(self._workers))]
+
+    def close(self):
+        """stop workers after queued jobs are done and close their sessions"""
+        for pool_worker in self._workers: self._jobs.put(None)
+        for pool_worker in self._workers: pool_worker.join()
+        self._workers = []; self._sessions = []
+        return True
+
+# add module functions as Session methods, eg session.url() runs url() on that session,
+# except functions for whole python process or tagui installation instead of one session
+_session_excluded = ['setup', 'pack', 'update', 'serve', 'tagui_location', 'doctor', 'error', 'debug']
+for _function_name, _function in list(globals().items()):
+    if not _function_name.startswith('_') and isinstance(_function, types.FunctionType) \
+    and _function.__module__ == __name__ and _function_name not in _session_excluded:
+        setattr(Session, _function_name, _session_method(_function))